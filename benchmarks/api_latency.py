@@ -0,0 +1,51 @@
+"""
+Measures connexion API setup time with and without schema cache and
+/api/slips latency with and without response validation.
+
+Usage: python -m benchmarks.api_latency [rows] [per_page]
+"""
+import base64
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+from .utils import make_app, settings_file, timeit
+
+HEADERS = {'Authorization': f'Basic {base64.b64encode(b"user:password").decode("utf-8")}'}
+
+
+def setup_time(cache_path: str) -> float:
+    import connexion
+    from flask_app.api.schema import load_schema
+    from config import Config
+
+    start = perf_counter()
+    app = connexion.FlaskApp(__name__)
+    app.add_api(load_schema(Config.SCHEMA_PATH, cache_path), strict_validation=True)
+    return perf_counter() - start
+
+
+def main(rows: int = 20000, per_page: int = 1000):
+    cache_path = os.path.join(tempfile.mkdtemp(), 'schema.json')
+    setup_time(cache_path)
+    print(f'add_api without cache{setup_time(None) * 1000:8.1f} ms')
+    print(f'add_api with cache   {setup_time(cache_path) * 1000:8.1f} ms')
+
+    for validate in (True, False):
+        os.environ['FLASK_APPLICATION_SETTINGS'] = settings_file(
+            API_VALIDATE_RESPONSES=validate
+        )
+        app = make_app(rows)
+        client = app.test_client()
+        params = {'date': ['2019-12-01', '2020-02-01'], 'per_page': per_page}
+
+        def get():
+            response = client.get('/api/slips', query_string=params, headers=HEADERS)
+            assert response.status_code == 200, response.data
+        seconds, _ = timeit(get, repeat=10)
+        print(f'validate_responses={validate!s:5s} {seconds * 1000:8.1f} ms per {per_page} rows')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,33 @@
+"""
+Compares rows per second of csv export for all search results:
+legacy per-row ORM path against chunked column tuples path.
+
+Usage: python -m benchmarks.csv_export [rows]
+"""
+import sys
+
+from .utils import make_app, timeit
+
+
+def legacy_csv(query):
+    from flask_app.base.functions import prettify_result, csv_as_bytes
+    write_headers = True
+    for row in query.yield_per(1000):
+        data_all = prettify_result([row])
+        data_all[0].pop('_id')
+        yield csv_as_bytes(data_all, write_headers)
+        write_headers = False
+
+
+def main(rows: int = 50000):
+    make_app(rows)
+    from db import Slip
+    from flask_app.base.functions import stream_query_csv
+
+    for name, func in (('legacy', legacy_csv), ('chunked', stream_query_csv)):
+        seconds, size = timeit(lambda: sum(map(len, func(Slip.query))))
+        print(f'{name:10s}{rows / seconds:12.0f} rows/s{size / 2 ** 20:10.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
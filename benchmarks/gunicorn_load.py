@@ -0,0 +1,115 @@
+"""
+Compares gunicorn sync and gthread workers, serving short /api/slips
+requests while slow clients download big pages.  Client delay between
+reads emulates network transfer: a sync worker can't serve anybody else
+until such response is sent.
+
+Usage: python -m benchmarks.gunicorn_load [rows] [downloads] [delay_ms]
+"""
+import base64
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from urllib.parse import urlencode
+
+from .utils import make_app, settings_file
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+HEADERS = {'Authorization': f'Basic {base64.b64encode(b"user:password").decode("utf-8")}'}
+PORT = 5071
+THREADS = 8
+
+
+def request(page_id: int, per_page: int, delay: float = 0) -> float:
+    """Gets a page of slips reading it with delay, returns seconds spent."""
+    start = perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=600)
+    # Small receive window keeps loopback from buffering whole response,
+    # as a slow network would.
+    conn.sock = socket.socket()
+    conn.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 32 * 1024)
+    conn.sock.connect(('127.0.0.1', PORT))
+    query = urlencode(
+        {'date': ['2019-12-01', '2020-01-31'], 'page_id': page_id, 'per_page': per_page},
+        doseq=True
+    )
+    conn.request('GET', f'/api/slips?{query}', headers=HEADERS)
+    response = conn.getresponse()
+    while response.read(32 * 1024):
+        sleep(delay)
+    conn.close()
+    assert response.status == 200, response.status
+    return perf_counter() - start
+
+
+def serve(args: list, env: dict) -> subprocess.Popen:
+    """Starts gunicorn with args and waits until it accepts connections."""
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn.app.wsgiapp',
+            '-b', f'127.0.0.1:{PORT}', *args, 'slip_app:app'
+        ],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(300):
+        try:
+            socket.create_connection(('127.0.0.1', PORT), timeout=1).close()
+            return server
+        except OSError:
+            sleep(0.1)
+    server.kill()
+    raise RuntimeError('gunicorn did not start.')
+
+
+def run(args: list, env: dict, rows: int, downloads: int, delay: float) -> list:
+    """Returns latencies of short requests, sent while downloads are running."""
+    server = serve(args, env)
+    try:
+        request(1, 50)
+        pages = [i % 5 + 1 for i in range(4 * THREADS)]
+        with ThreadPoolExecutor(downloads + THREADS) as pool:
+            slow = [pool.submit(request, 1, rows, delay) for _ in range(downloads)]
+            sleep(0.5)
+            latencies = list(pool.map(request, pages, [50] * len(pages)))
+            for future in slow:
+                future.result()
+        return latencies
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(rows: int = 20000, downloads: int = 2, delay_ms: int = 20):
+    db_path = os.path.join(tempfile.mkdtemp(), 'load.db')
+    settings = settings_file(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{db_path}',
+        API_CACHE_MAXBYTES=0,
+        API_VALIDATE_RESPONSES=False,
+        DEBUG=False,
+    )
+    os.environ['FLASK_APPLICATION_SETTINGS'] = settings
+    make_app(rows)
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_APPLICATION_SETTINGS=settings)
+
+    print(f'latency of short requests during {downloads} slow downloads')
+    for name, args in (
+        ('sync, 1 worker', ['-w', '1']),
+        (f'gthread, 1 worker x {THREADS} threads',
+         ['-w', '1', '-k', 'gthread', '--threads', str(THREADS)]),
+        (f'sync, {THREADS} workers', ['-w', str(THREADS)]),
+    ):
+        latencies = run(args, env, rows, downloads, delay_ms / 1000)
+        print(
+            f'  {name:<30}median {statistics.median(latencies) * 1000:8.0f} ms'
+            f'   max {max(latencies) * 1000:8.0f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
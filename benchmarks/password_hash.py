@@ -0,0 +1,53 @@
+"""
+Measures login throughput for password hashing settings, to choose
+PASSWORD_HASH_METHOD and PASSWORD_HASH_ITERATIONS fitting CPU budget.
+
+Usage: python -m benchmarks.password_hash [logins]
+"""
+import os
+import sys
+from time import perf_counter
+
+from .utils import make_app, settings_file
+
+settings = (
+    ('pbkdf2:sha256', 260000),
+    ('pbkdf2:sha256', 150000),
+    ('pbkdf2:sha256', 50000),
+    ('pbkdf2:sha256', 10000),
+    ('pbkdf2:sha512', 50000),
+)
+
+
+def main(logins: int = 20):
+    for method, iterations in settings:
+        os.environ['FLASK_APPLICATION_SETTINGS'] = settings_file(
+            PASSWORD_HASH_METHOD=method,
+            PASSWORD_HASH_ITERATIONS=iterations,
+        )
+        app = make_app()
+        from flask_app.auth import db, models
+        user = models.User(
+            username='bench_user',
+            email='bench@bench.bench',
+            is_verified=True,
+            is_active=True
+        )
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        form = {'username': 'bench_user', 'password': 'password'}
+
+        start = perf_counter()
+        for _ in range(logins):
+            response = client.post('/login', data=form)
+            assert response.status_code == 302, response.data
+            client.get('/logout')
+        seconds = perf_counter() - start
+        print(f'{method}:{iterations:<7d} {logins / seconds:8.1f} logins/s')
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
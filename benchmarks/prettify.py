@@ -0,0 +1,45 @@
+"""
+Compares memory and latency of serializing one page of search results:
+full Slip objects with Slip.to_json against projected column tuples.
+
+Usage: python -m benchmarks.prettify [rows]
+"""
+import sys
+import tracemalloc
+
+from .utils import make_app, timeit
+
+
+def legacy_page(query, rows):
+    from flask_app.base.functions import exclude_keys, exclude_list
+    slips = query.limit(rows).all()
+    result = [exclude_keys(el.to_json(), exclude_list) for el in slips]
+    result = [{**el, '_id': str(i)} for i, el in enumerate(result, start=1)]
+    return slips, result
+
+
+def projected_page(query, rows):
+    from flask_app.base.functions import display_columns, prettify_result
+    data = query.with_entities(*display_columns()).limit(rows).all()
+    return data, prettify_result(data)
+
+
+def main(rows: int = 1000):
+    make_app(rows)
+    from db import Slip
+    from flask_app import db_slip
+
+    for name, func in (('legacy', legacy_page), ('projected', projected_page)):
+        seconds, _ = timeit(lambda: func(Slip.query, rows), repeat=10)
+        db_slip.session.expunge_all()
+        tracemalloc.start()
+        data, result = func(Slip.query, rows)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db_slip.session.expunge_all()
+        print(f'{name:10s}{seconds * 1000:8.1f} ms'
+              f'{peak / 2 ** 10 / rows * 1000:10.0f} KiB per 1000 rows (peak)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
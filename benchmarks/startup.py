@@ -0,0 +1,97 @@
+"""
+Measures cold start of a worker: import time and first request latency
+of the web app, and import time and first query latency of the parser
+CLI.  Every run is a fresh interpreter, as a new gunicorn worker or cron
+job would be.
+
+Usage: python -m benchmarks.startup [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from .utils import test_config_path
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+WEB = '''
+import json, sys
+from time import perf_counter
+start = perf_counter()
+from flask_app import create_app
+imported = perf_counter()
+app = create_app()
+created = perf_counter()
+client = app.test_client()
+client.get('/login')
+web_request = perf_counter()
+client.get('/api/cache/stats')
+api_request = perf_counter()
+json.dump({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first web request': web_request - created,
+    'first API request': api_request - web_request,
+    'total': api_request - start,
+    'heavy modules': sorted({'connexion', 'alembic'} & set(sys.modules)),
+}, sys.stdout)
+'''
+
+PARSER = '''
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import run_parser
+imported = perf_counter()
+from db import SessionCM
+with SessionCM as session:
+    session.execute('select 1')
+queried = perf_counter()
+json.dump({
+    'import': imported - start,
+    'first query': queried - imported,
+    'total': queried - start,
+    'heavy modules': sorted({'flask', 'connexion', 'alembic'} & set(sys.modules)),
+}, sys.stdout)
+'''
+
+
+def run(code: str, env: dict) -> dict:
+    # Runs in a temporary dir, so logs of the app don't litter the project.
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=os.path.dirname(env['STARTUP_DB']), env=env,
+        check=True, stdout=subprocess.PIPE
+    ).stdout
+    return json.loads(output)
+
+
+def best(code: str, env: dict, runs: int) -> dict:
+    results = [run(code, env) for _ in range(runs)]
+    return {
+        key: min(result[key] for result in results) if key != 'heavy modules' else results[0][key]
+        for key in results[0]
+    }
+
+
+def main(runs: int = 5):
+    db_path = os.path.join(tempfile.mkdtemp(), 'startup.db')
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        FLASK_APPLICATION_SETTINGS=os.path.abspath(test_config_path),
+        DATABASE_URL=f'sqlite:///{db_path}',
+        STARTUP_DB=db_path,
+    )
+    for name, code in (('web app', WEB), ('parser CLI', PARSER)):
+        print(name)
+        for key, value in best(code, env, runs).items():
+            if isinstance(value, float):
+                print(f'  {key:<20}{value * 1000:8.1f} ms')
+            else:
+                print(f'  {key:<20}{value}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,61 @@
+import os
+import tempfile
+from time import perf_counter
+from typing import Callable, Tuple
+
+test_config_path = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'tests', 'test_config.py'
+)
+os.environ.setdefault('FLASK_APPLICATION_SETTINGS', os.path.abspath(test_config_path))
+
+
+def make_app(slips_count: int = 0):
+    """
+    Creates testing app with in-memory DB and pushes it's context.
+
+    Parameters
+    ----------
+    slips_count
+        Number of fake slips to insert into DB.
+
+    Returns
+    -------
+    Flask
+        Application with pushed app context.
+
+    """
+    from flask_app import create_app, db_slip
+    from flask_app.auth import db
+    from tests.slip_obj import SlipFactory
+
+    app = create_app()
+    app.app_context().push()
+    db_slip.create_all()
+    db.create_all()
+    if slips_count:
+        db_slip.session.add_all([SlipFactory.build() for _ in range(slips_count)])
+        db_slip.session.commit()
+    return app
+
+
+def settings_file(**settings) -> str:
+    """Writes testing settings file with extra settings, returns it's path."""
+    fd, path = tempfile.mkstemp(suffix='.py')
+    with os.fdopen(fd, 'w') as f:
+        f.write(open(test_config_path).read())
+        for key, value in settings.items():
+            f.write(f'\n{key} = {value!r}\n')
+    return path
+
+
+def timeit(func: Callable, repeat: int = 3) -> Tuple[float, object]:
+    """
+    Runs func repeat times and returns best wall time and last result.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        best = min(best, perf_counter() - start)
+    return best, result
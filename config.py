@@ -14,6 +14,24 @@ class Config:
     SQLALCHEMY_DATABASE_URI = \
         os.getenv('DATABASE_URL', f'sqlite:///{example_db_path}')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # One engine per database is shared by the app and the parser, see
+    # db.engines.  Pool settings don't apply to SQLite in memory.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 60 * 60)),
+        'pool_pre_ping': bool(int(os.getenv('DB_POOL_PRE_PING', 1))),
+    }
+    # SQLite pragmas, set on every new connection, empty leaves SQLite default.
+    # WAL lets the parser write while the app reads, busy_timeout makes
+    # writers wait for each other inside SQLite instead of failing.
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    # Memory mapped reads and page cache per connection, negative is KiB.
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024))
     # Flask-Mail settings.
     MAIL_SERVER = os.getenv('MAIL_SERVER')
     MAIL_PORT = os.getenv('MAIL_PORT')
@@ -23,15 +41,65 @@ class Config:
     MAIL_FLAG = all(
         (MAIL_SERVER, MAIL_PORT, MAIL_USE_TLS, MAIL_USERNAME, MAIL_PASSWORD)
     )
+    # Outbound mail queue, see flask_app.auth.mail_queue.
+    MAIL_QUEUE_DIR = os.getenv('MAIL_QUEUE_DIR', pth.join(pth.dirname(__file__), 'mail_queue'))
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+    MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_DELAY = int(os.getenv('MAIL_RETRY_DELAY', 60))
+    MAIL_POLL_INTERVAL = int(os.getenv('MAIL_POLL_INTERVAL', 5))
+    MAIL_TIMEOUT = int(os.getenv('MAIL_TIMEOUT', 30))
+    MAIL_CLAIM_TIMEOUT = int(os.getenv('MAIL_CLAIM_TIMEOUT', 10 * 60))
     # API settings.
     SCHEMA_PATH = \
         pth.join(pth.dirname(__file__), 'flask_app', 'api', 'openapischema.yaml')
+    # Parsed schema is cached here, set empty to disable caching.
+    SCHEMA_CACHE_PATH = os.getenv('SCHEMA_CACHE_PATH', f'{pth.splitext(SCHEMA_PATH)[0]}.json')
+    # Response validation is expensive for long lists, so it's off in production.
+    API_VALIDATE_RESPONSES = os.getenv(
+        'API_VALIDATE_RESPONSES',
+        str(ENV != 'production')
+    ).lower() in ('1', 'true', 'yes')
     JSON_AS_ASCII = False
     PASSWORD = os.getenv('DB_PASSWORD', 'password')
     API_PASSWORD = hashlib.sha512(
         PASSWORD.encode('utf-8') + SECRET_KEY.encode('utf-8')
     ).hexdigest()
     API_USER = os.getenv('API_USER', 'user')
+    AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 1024))
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 5 * 60))
+    API_TOKEN_TTL = int(os.getenv('API_TOKEN_TTL', 60 * 60))
+    # Cache for slip lists, in-process unless Redis URL is set.
+    API_CACHE_URL = os.getenv('API_CACHE_URL', '')
+    API_CACHE_MAXBYTES = int(os.getenv('API_CACHE_MAXBYTES', 64 * 1024 * 1024))
+    API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 60))
+    # Password hashing policy, hashes made with another one are upgraded on login.
+    # See werkzeug.security.generate_password_hash for methods.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 150000))
+    PASSWORD_SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', 8))
+    # Cache of user records for authenticated requests.
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+    # Where last search of every user is kept for paging: 'cookie', 'memory' or 'file'.
+    QUERY_STORE = os.getenv('QUERY_STORE', 'cookie')
+    QUERY_STORE_TTL = int(os.getenv('QUERY_STORE_TTL', 24 * 60 * 60))
+    QUERY_STORE_DIR = os.getenv('QUERY_STORE_DIR', pth.join(pth.dirname(__file__), 'queries'))
+    # Users per page on the admin page.
+    ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 50))
+    # Maintenance jobs, run by one process at a time, intervals in seconds,
+    # zero disables a job.  See flask_app.scheduler.
+    SCHEDULER_LOCK_PATH = os.getenv('SCHEDULER_LOCK_PATH', pth.join(pth.dirname(__file__), 'scheduler.lock'))
+    SCHEDULER_STATE_PATH = os.getenv('SCHEDULER_STATE_PATH', pth.join(pth.dirname(__file__), 'scheduler.json'))
+    SCHEDULER_TICK = int(os.getenv('SCHEDULER_TICK', 60))
+    SCHEDULER_HISTORY = int(os.getenv('SCHEDULER_HISTORY', 20))
+    SCHEDULER_CLEANUP_INTERVAL = int(os.getenv('SCHEDULER_CLEANUP_INTERVAL', 24 * 60 * 60))
+    SCHEDULER_STATS_INTERVAL = int(os.getenv('SCHEDULER_STATS_INTERVAL', 24 * 60 * 60))
+    SCHEDULER_STATS_DAYS = int(os.getenv('SCHEDULER_STATS_DAYS', 31))
+    SCHEDULER_PRUNE_INTERVAL = int(os.getenv('SCHEDULER_PRUNE_INTERVAL', 60 * 60))
+    # Background export settings.
+    EXPORT_DIR = os.getenv('EXPORT_DIR', pth.join(pth.dirname(__file__), 'exports'))
+    EXPORT_TTL = int(os.getenv('EXPORT_TTL', 60 * 60))
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
 
 
 POPPLER_PATH = os.getenv(
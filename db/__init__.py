@@ -1,3 +1,3 @@
-from .db import Base, Session, SessionCM
+from .db import Base, Session, SessionCM, get_engine
 from .utils import try_query, check_exist
-from .models_new import Slip
+from .models_new import Slip, SlipVersion, SlipStat
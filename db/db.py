@@ -1,14 +1,45 @@
-from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 import sqlalchemy.orm as orm
 
 import config
+from . import engines
 
 
 Base = declarative_base()
 
 db_address = config.slip_db
-engine = create_engine(db_address)
-Session = orm.sessionmaker(bind=engine)
+
+
+def get_engine() -> Engine:
+    """
+    Returns engine for config.slip_db from db.engines registry, creating
+    it on first call, so importing db neither loads DB driver nor needs DB
+    settings.  The app shares this engine, if it uses the same database.
+    """
+    settings = vars(config.Config)
+    return engines.get_engine(
+        db_address,
+        pragmas=engines.sqlite_pragmas(settings),
+        **settings['SQLALCHEMY_ENGINE_OPTIONS']
+    )
+
+
+class LazySessionmaker(orm.sessionmaker):
+    """Sessionmaker, binding sessions to get_engine() if no bind is set."""
+    def __call__(self, **local_kw) -> orm.Session:
+        if self.kw.get('bind') is None and 'bind' not in local_kw:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+
+def __getattr__(name: str):
+    # Keeps db.db.engine working for scripts.
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+Session = LazySessionmaker()
 from .utils import SessionContextManager
 SessionCM = SessionContextManager(Session)
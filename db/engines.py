@@ -0,0 +1,133 @@
+from collections import Counter
+from threading import Lock
+from typing import Any, Dict, Mapping
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+# Options of QueuePool, not accepted by other pools.
+queue_pool_options = ('pool_size', 'max_overflow', 'pool_timeout')
+
+_engines: Dict[str, Engine] = {}
+_counters: Dict[str, Counter] = {}
+_lock = Lock()
+
+
+def sqlite_pragmas(settings: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Returns SQLite pragmas, applied to every new connection, from
+    SQLITE_* settings.  Empty setting leaves SQLite default.
+
+    Parameters
+    ----------
+    settings
+        Flask app.config or vars(config.Config).
+
+    Returns
+    -------
+    Dict[str, Any]
+        Pragma names and values.
+
+    """
+    pragmas = {
+        'journal_mode': settings.get('SQLITE_JOURNAL_MODE'),
+        'busy_timeout': settings.get('SQLITE_BUSY_TIMEOUT'),
+        'synchronous': settings.get('SQLITE_SYNCHRONOUS'),
+        'mmap_size': settings.get('SQLITE_MMAP_SIZE'),
+        'cache_size': settings.get('SQLITE_CACHE_SIZE'),
+    }
+    return {name: value for name, value in pragmas.items() if value not in (None, '')}
+
+
+def get_engine(url: str, pragmas: Dict[str, Any] = None, **options) -> Engine:
+    """
+    Returns the engine for url, creating it on first call, so db.Session,
+    the slip DB and the auth DB of the app share one pool per database.
+    Options of the first call win.
+
+    SQLite in memory gets one static connection, as it's data lives in
+    the connection, and is never shared: every call creates a new private
+    database, as SQLAlchemy does.  SQLite files get a thread safe QueuePool
+    instead of SQLAlchemy default NullPool, so pragmas and page cache
+    survive between sessions.
+
+    Parameters
+    ----------
+    url
+        Database URL.
+    pragmas
+        SQLite pragmas, executed on every new connection.
+    options
+        create_engine options, such as pool_size, max_overflow,
+        pool_recycle and pool_pre_ping.
+
+    Returns
+    -------
+    Engine
+        Shared engine.
+
+    """
+    key = str(url)
+    with _lock:
+        engine = _engines.get(key)
+        if engine is not None:
+            return engine
+
+        sa_url = make_url(key)
+        in_memory = False
+        if sa_url.drivername.startswith('sqlite'):
+            options['connect_args'] = {'check_same_thread': False, **options.get('connect_args', {})}
+            in_memory = sa_url.database in (None, '', ':memory:')
+            if in_memory:
+                options['poolclass'] = StaticPool
+                for option in queue_pool_options:
+                    options.pop(option, None)
+            else:
+                options.setdefault('poolclass', QueuePool)
+        engine = create_engine(sa_url, **options)
+
+        counter = Counter()
+
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            counter['connects'] += 1
+            if pragmas:
+                cursor = dbapi_connection.cursor()
+                for name, value in pragmas.items():
+                    cursor.execute(f'PRAGMA {name} = {value}')
+                cursor.close()
+
+        @event.listens_for(engine, 'checkout')
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            counter['checkouts'] += 1
+
+        if not in_memory:
+            _engines[key] = engine
+            _counters[key] = counter
+    return engine
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns pool state of every engine: connections open in the pool,
+    checked out and over the pool size, and counters of new connections
+    and checkouts.  Passwords in URLs are masked.
+    """
+    stats = {}
+    with _lock:
+        for key, engine in _engines.items():
+            pool = engine.pool
+            engine_stats: Dict[str, Any] = {'pool': type(pool).__name__}
+            if isinstance(pool, QueuePool):
+                engine_stats.update(
+                    size=pool.size(),
+                    checked_in=pool.checkedin(),
+                    checked_out=pool.checkedout(),
+                    overflow=pool.overflow(),
+                )
+            engine_stats.update(_counters[key])
+            stats[repr(engine.url)] = engine_stats
+    return stats
+
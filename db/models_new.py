@@ -28,6 +28,9 @@ class Slip(Base):
     auth_code = Column('auth_code', String, index=True)
     ref_num = Column('ref_num', Integer, index=True)
     payment_type = Column('payment_type', String)
+    # On PostgreSQL slips are partitioned by date, so the table's primary
+    # key is (file_link, date), and file_link is kept unique by a trigger
+    # with slip_file_links table.  See migration 5e0c8a1d2b7f.
     file_link = Column('file_link', String, index=True, unique=True, primary_key=True)
 
     updated = Column('updated', Date)
@@ -51,3 +54,29 @@ class Slip(Base):
             'time': self.time.strftime('%H:%M')
         }
         return attr_dict
+
+
+class SlipVersion(Base):
+    """
+    Change counter for slips of one month, bumped by every write.
+    Used as a cheap marker to build ETags without querying slips.
+    """
+    __tablename__ = 'slip_versions'
+
+    month = Column('month', Date, primary_key=True)
+    version = Column('version', Integer, nullable=False, default=0)
+
+
+class SlipStat(Base):
+    """
+    Daily totals of slips per object, POS-terminal and operation type.
+    Kept in sync with slips by db.stats functions.
+    """
+    __tablename__ = 'slip_stats'
+
+    date = Column('date', Date, primary_key=True)
+    object_code = Column('object_code', String, primary_key=True)
+    pos_id = Column('pos_id', String, primary_key=True)
+    operation_type = Column('operation_type', String, primary_key=True)
+    count = Column('count', Integer, nullable=False, default=0)
+    summ = Column('summ', Float, nullable=False, default=0)
@@ -0,0 +1,197 @@
+import datetime as dt
+from typing import Iterable, Iterator, List, Set, Tuple
+
+from sqlalchemy.engine import Connectable
+import sqlalchemy.orm as orm
+
+from .models_new import Slip, SlipVersion
+from .utils import insert_missing
+
+# (database URL, partition name) of partitions seen in pg_inherits.  Only
+# committed partitions are remembered: one, created by a transaction that
+# is then rolled back, must be created again.
+_known_partitions: Set[Tuple[str, str]] = set()
+
+
+def month_start(date: dt.date) -> dt.date:
+    """
+    Returns first day of the month for date.
+
+    Parameters
+    ----------
+    date
+        Any date within the month.
+
+    Returns
+    -------
+    dt.date
+        First day of the same month.
+
+    """
+    return date.replace(day=1)
+
+
+def next_month(date: dt.date) -> dt.date:
+    """
+    Returns first day of the month, following the month of date.
+
+    Parameters
+    ----------
+    date
+        Any date within the month.
+
+    Returns
+    -------
+    dt.date
+        First day of the next month.
+
+    """
+    return (month_start(date) + dt.timedelta(days=32)).replace(day=1)
+
+
+def month_bounds(
+    start_date: dt.date,
+    end_date: dt.date
+) -> Iterator[Tuple[dt.date, dt.date]]:
+    """
+    Yields half-open [first day, first day of next month) ranges for every
+    month overlapping [start_date, end_date].
+
+    Parameters
+    ----------
+    start_date
+        Start of the range, inclusive.
+    end_date
+        End of the range, inclusive.
+
+    Yields
+    ------
+    Tuple[dt.date, dt.date]
+        Lower (inclusive) and upper (exclusive) bounds of the month.
+
+    """
+    current = month_start(start_date)
+    while current <= end_date:
+        upper = next_month(current)
+        yield current, upper
+        current = upper
+
+
+def partition_name(date: dt.date, table_name: str = Slip.__tablename__) -> str:
+    """
+    Returns name of the monthly partition, holding rows for date.
+
+    Examples
+    --------
+    >>> partition_name(dt.date(2020, 2, 6))
+    'slips_y2020m02'
+
+    """
+    return f'{table_name}_y{date.year}m{date.month:02d}'
+
+
+def ensure_partitions(bind: Connectable, dates: Iterable[dt.date]) -> List[str]:
+    """
+    Creates missing monthly partitions of slips table for all dates.
+    Call it before rows are written: rows of a month without partition go
+    to the default partition, and then the month's partition can't be
+    created.  Only PostgreSQL supports declarative partitioning, for other
+    dialects nothing is done - all slips stay in one table, filtered by
+    date index.
+
+    Parameters
+    ----------
+    bind
+        Engine or connection to the slip DB.
+    dates
+        Dates of rows that are about to be inserted.
+
+    Returns
+    -------
+    List[str]
+        Names of partitions, ensured to exist.
+
+    """
+    if bind.dialect.name != 'postgresql':
+        return []
+    table_name = Slip.__tablename__
+    url = str(bind.engine.url)
+    months = sorted({month_start(date) for date in dates if date})
+    names = [partition_name(lower, table_name) for lower in months]
+    if any((url, name) not in _known_partitions for name in names):
+        # CREATE TABLE ... PARTITION OF locks the parent table exclusively
+        # even if the partition exists, so DDL runs for missing months only.
+        _known_partitions.update((url, name) for name, in bind.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            f"WHERE i.inhparent = '{table_name}'::regclass"
+        ))
+    for lower, name in zip(months, names):
+        if (url, name) in _known_partitions:
+            continue
+        bind.execute(
+            f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} '
+            f"FOR VALUES FROM ('{lower.isoformat()}') "
+            f"TO ('{next_month(lower).isoformat()}')"
+        )
+    return names
+
+
+def bump_versions(session: orm.Session, dates: Iterable[dt.date]) -> None:
+    """
+    Increments change counters for all months of dates, within session's
+    transaction.  Call it on every write to slips.
+
+    Parameters
+    ----------
+    session
+        Session to the slip DB.
+    dates
+        Dates of inserted, changed or deleted rows.
+
+    Returns
+    -------
+    None
+
+    """
+    months = {month_start(date) for date in dates if date}
+    if not months:
+        return
+    # Counters are created at 0 and then incremented by the same UPDATE,
+    # so concurrent writers of a new month never collide on INSERT.
+    insert_missing(
+        session,
+        SlipVersion.__table__,
+        [{'month': month, 'version': 0} for month in sorted(months)]
+    )
+    session.query(SlipVersion). \
+        filter(SlipVersion.month.in_(months)). \
+        update({SlipVersion.version: SlipVersion.version + 1}, synchronize_session=False)
+
+
+def get_versions(
+    session: orm.Session,
+    start_date: dt.date,
+    end_date: dt.date
+) -> List[Tuple[dt.date, int]]:
+    """
+    Returns change counters for all months overlapping [start_date, end_date].
+
+    Parameters
+    ----------
+    session
+        Session to the slip DB.
+    start_date
+        Start of the range, inclusive.
+    end_date
+        End of the range, inclusive.
+
+    Returns
+    -------
+    List[Tuple[dt.date, int]]
+        Months with their counters, months without writes are omitted.
+
+    """
+    return session.query(SlipVersion.month, SlipVersion.version). \
+        filter(SlipVersion.month.between(month_start(start_date), end_date)). \
+        order_by(SlipVersion.month).all()
@@ -0,0 +1,128 @@
+import datetime as dt
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple, Union
+
+from sqlalchemy import bindparam, and_, select
+import sqlalchemy.orm as orm
+import sqlalchemy.sql.functions as func
+
+from .models_new import Slip, SlipStat
+from .utils import insert_missing
+
+
+StatKey = Tuple[dt.date, str, str, str]
+
+stat_table = SlipStat.__table__
+key_columns = ('date', 'object_code', 'pos_id', 'operation_type')
+
+
+def aggregate(
+    slips: Iterable[Dict[str, Union[str, float, dt.date]]]
+) -> Dict[StatKey, Tuple[int, float]]:
+    """
+    Sums slips by (date, object_code, pos_id, operation_type).  Slips
+    without date are skipped, as date is a part of the primary key.
+
+    Parameters
+    ----------
+    slips
+        Dicts with Slip attributes, date should be datetime.date.
+
+    Returns
+    -------
+    Dict[StatKey, Tuple[int, float]]
+        Count and sum of summ for every key.
+
+    """
+    totals = defaultdict(lambda: [0, 0.0])
+    for slip in slips:
+        if not slip.get('date'):
+            continue
+        key = tuple(slip.get(column) or '' for column in key_columns)
+        total = totals[key]
+        total[0] += 1
+        total[1] += float(slip.get('summ') or 0)
+    return {key: tuple(total) for key, total in totals.items()}
+
+
+def add_stats(
+    session: orm.Session,
+    slips: Iterable[Dict[str, Union[str, float, dt.date]]]
+) -> None:
+    """
+    Adds newly inserted slips to daily totals, within session's transaction.
+    Missing rows are inserted with zero totals, skipping existing ones, and
+    then all rows are incremented with one executemany UPDATE, so
+    concurrent inserts of the same day don't fail with IntegrityError.
+
+    Parameters
+    ----------
+    session
+        Session to the slip DB.
+    slips
+        Dicts with attributes of inserted slips.
+
+    Returns
+    -------
+    None
+
+    """
+    totals = aggregate(slips)
+    if not totals:
+        return
+    insert_missing(session, stat_table, [
+        {**dict(zip(key_columns, key)), 'count': 0, 'summ': 0.0}
+        for key in totals
+    ])
+    statement = stat_table.update(). \
+        where(and_(*(stat_table.c[c] == bindparam(f'b_{c}') for c in key_columns))). \
+        values(
+            count=stat_table.c.count + bindparam('b_count'),
+            summ=stat_table.c.summ + bindparam('b_summ')
+        )
+    session.execute(statement, [
+        {**{f'b_{c}': v for c, v in zip(key_columns, key)}, 'b_count': count, 'b_summ': summ}
+        for key, (count, summ) in totals.items()
+    ])
+
+
+def refresh_stats(
+    session: orm.Session,
+    start_date: dt.date,
+    end_date: dt.date
+) -> None:
+    """
+    Recounts daily totals for [start_date, end_date] from slips with one
+    INSERT ... SELECT, within session's transaction.  Used after updates
+    and deletes, that can't be applied incrementally.
+
+    Parameters
+    ----------
+    session
+        Session to the slip DB.
+    start_date
+        Start of the range, inclusive.
+    end_date
+        End of the range, inclusive.
+
+    Returns
+    -------
+    None
+
+    """
+    session.flush()
+    session.query(SlipStat). \
+        filter(SlipStat.date.between(start_date, end_date)). \
+        delete(synchronize_session=False)
+    keys = [
+        Slip.date,
+        func.coalesce(Slip.object_code, ''),
+        func.coalesce(Slip.pos_id, ''),
+        func.coalesce(Slip.operation_type, ''),
+    ]
+    totals = select([*keys, func.count(), func.coalesce(func.sum(Slip.summ), 0)]). \
+        where(Slip.date.between(start_date, end_date)). \
+        group_by(*keys)
+    session.execute(
+        stat_table.insert().from_select([*key_columns, 'count', 'summ'], totals)
+    )
@@ -1,9 +1,11 @@
-from typing import Union, List, Tuple, Callable
+from typing import Any, Dict, Union, List, Tuple, Callable
 from contextlib import contextmanager
 from time import sleep
 import random
 
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError, OperationalError
 import sqlalchemy.orm as orm
 
 from .db import Base, Session
@@ -42,7 +44,7 @@ def try_query(
 
     """
     err_counter = 0
-    for err_counter in range(60):
+    for err_counter in range(tries):
         try:
             result = query()
         except OperationalError:
@@ -59,6 +61,50 @@ def try_query(
     return result
 
 
+def insert_missing(
+    session: orm.Session,
+    table: Table,
+    rows: List[Dict[str, Any]]
+) -> None:
+    """
+    Inserts rows, skipping ones whose primary key already exists, within
+    session's transaction.  Unlike SELECT, then INSERT, it doesn't fail with
+    IntegrityError, when a concurrent transaction inserts the same key.
+    Uses ON CONFLICT DO NOTHING on PostgreSQL, INSERT OR IGNORE on SQLite,
+    INSERT IGNORE on MySQL and a savepoint per row on other dialects.
+
+    Parameters
+    ----------
+    session
+        Session to the DB.
+    table
+        Table to insert to.
+    rows
+        Dicts with column values.
+
+    Returns
+    -------
+    None
+
+    """
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        session.execute(postgresql.insert(table).on_conflict_do_nothing(), rows)
+    elif dialect == 'sqlite':
+        session.execute(table.insert().prefix_with('OR IGNORE'), rows)
+    elif dialect == 'mysql':
+        session.execute(table.insert().prefix_with('IGNORE'), rows)
+    else:
+        for row in rows:
+            try:
+                with session.begin_nested():
+                    session.execute(table.insert(), row)
+            except IntegrityError:
+                pass
+
+
 class SessionContextManager:
     """
     Class for using sessions as context manager.  Takes sessionmaker as
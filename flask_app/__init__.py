@@ -1,10 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
-import connexion
 from loguru import logger
 
 from config import Config
-from db import Base, Slip
-from flask_app.auth import db, models
+from db import Base
+from .database import SQLAlchemy
 
 
 db_slip = SQLAlchemy(model_class=Base)
@@ -19,38 +17,64 @@ def create_app():
         retention='15 days',
         level='DEBUG'
     )
+    # Connexion and the API are imported here, not on import of flask_app,
+    # so scripts using db_slip or models don't load them.
+    import connexion
     connexion_app = connexion.FlaskApp(__name__)
-    schema_path = Config.SCHEMA_PATH
-    from . import api
-    connexion_app.add_api(schema_path, strict_validation=True, validate_responses=True)
-
     app = connexion_app.app
     app.config.from_object(Config)
     app.config.from_envvar('FLASK_APPLICATION_SETTINGS', silent=True)
 
+    from . import api
+    from .api.schema import connexion_spec, load_schema
+    schema = load_schema(app.config['SCHEMA_PATH'], app.config['SCHEMA_CACHE_PATH'])
+    connexion_app.add_api(
+        connexion_spec(schema),
+        strict_validation=True,
+        validate_responses=app.config['API_VALIDATE_RESPONSES']
+    )
+
     # Initialize extensions.
     from . import auth
     auth.init_app(app)
     db_slip.init_app(app)
 
+    from .base.exports import exports
+    exports.init_app(app)
+
+    from .base import query_store
+    query_store.init_app(app)
+
+    from .cache import create_result_cache
+    app.extensions['result_cache'] = create_result_cache(app.config)
+
     # Register base blueprint.
     from .base.views import views as base_views
     from .admin.views import admin_bp
+    from .api.ingest import ingest_bp
     app.register_blueprint(base_views)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(ingest_bp)
 
     # Register shell context.
     register_shellcontext(app)
 
-    # Run background task.
-    from .admin.utils import run_delete_task
+    # Run background tasks.
+    from .scheduler import scheduler
+    from .auth.mail_queue import mail_queue
+    scheduler.init_app(app)
     if not app.config['TESTING']:
-        run_delete_task()
+        scheduler.start(app)
+        if app.config['MAIL_FLAG']:
+            mail_queue.start(app)
 
     return app
 
 
 def register_shellcontext(app):
+    from db import Slip
+    from flask_app.auth import db, models
+
     def shell_context():
         return {
             'db': db,
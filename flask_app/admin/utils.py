@@ -1,58 +1,56 @@
 import datetime as dt
 from functools import wraps
-from time import sleep
 from typing import List, Callable, Optional, Tuple, Union
-from multiprocessing import Process
 
-from flask import flash, redirect, url_for
+from flask import current_app, flash, redirect, url_for
+from flask_sqlalchemy import Pagination
 from flask_login import current_user, login_required
+from loguru import logger
 
-from flask_app.auth.models import User
+from flask_app.auth.models import User, user_cache
 from flask_app.auth import db
-from db import SessionCM
 from .forms import UserForm, NewUserForm
 
 
-def delete_unverified_users() -> None:
+def delete_unverified_users(chunk_size: int = 500) -> int:
     """
     Deletes users, whose e-mail is unverified for more than 5 days.
+    Runs daily by flask_app.scheduler.
+
+    Users are deleted with bulk DELETE statements by chunks of ids,
+    so neither whole set is loaded, nor the table is locked for long.
+
+    Parameters
+    ----------
+    chunk_size
+        Number of users deleted in one statement.
 
     Returns
     -------
-    None
-        Only works with DB.
+    int
+        Number of deleted users.
 
     """
     today = dt.datetime.now()
     cutoff_date = today - dt.timedelta(days=5)
-    with SessionCM as sess:
-        # print(sess.get_bind())
-        q = sess.query(User). \
-            filter_by(is_verified=False). \
-            filter(User.date_created < cutoff_date.date())
-        # print(q, cutoff_date)
-        old_unverified_users = q.all()
-        # print(old_unverified_users)
-        for user in old_unverified_users:
-            sess.delete(user)
-        sess.commit()
-
-
-def worker():
-    try:
-        while True:
-            delete_unverified_users()
-            sleep(5 * 24 * 60 * 60)  # wait for 5 days
-    except BaseException:  # Catch any exception and exit gracefully.
-        pass
-
-
-def run_delete_task() -> None:
-    """
-    Spawns parallel process to delete unverified users every 24h.
-    """
-    proc = Process(target=worker, daemon=True)
-    proc.start()
+    q = db.session.query(User.id). \
+        filter_by(is_verified=False). \
+        filter(User.date_created < cutoff_date.date()). \
+        limit(chunk_size)
+    counter = 0
+    while True:
+        user_ids = [user_id for user_id, in q]
+        if not user_ids:
+            break
+        counter += User.query. \
+            filter(User.id.in_(user_ids)). \
+            delete(synchronize_session=False)
+        db.session.commit()
+        # Bulk delete bypasses ORM events.
+        for user_id in user_ids:
+            user_cache.invalidate(user_id)
+    logger.info(f'Deleted {counter} unverified users, created before {cutoff_date.date()}.')
+    return counter
 
 
 def admin_required(func: Callable) -> Callable:
@@ -69,43 +67,60 @@ def admin_required(func: Callable) -> Callable:
     return decorated_view
 
 
-def make_forms(changed_form: Union[UserForm, NewUserForm, None]) -> Tuple[List[UserForm], NewUserForm]:
+def make_forms(
+    changed_form: Union[UserForm, NewUserForm, None],
+    page_id: int = 1,
+    search: str = ''
+) -> Tuple[List[UserForm], NewUserForm, Pagination]:
     """
-    Generates UserForms and a NewUserForm from all active users.
+    Generates UserForms for one page of users and a NewUserForm.
     Takes in account recently changed data from changed_form, if present.
 
     Parameters
     ----------
     changed_form
         Form with recently changed data.
+    page_id
+        Page number, ADMIN_PAGE_SIZE users per page, ordered by id.
+    search
+        Shows only users, whose username or e-mail contains search.
 
     Returns
     -------
-    List[FlaskForm]
-        List of forms for all users.
+    Tuple[List[UserForm], NewUserForm, Pagination]
+        Forms for the users on the page, form for a new user and
+        Flask-SQLAlchemy Pagination object.
 
     """
-    users = User.query.all()
-    user_ids = tuple(user.id for user in users)
-    next_id = max(user_ids) + 1
+    q = User.query
+    if search:
+        # Wildcards in search are matched literally.
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        pattern = f'%{escaped}%'
+        q = q.filter(db.or_(
+            User.username.ilike(pattern, escape='\\'),
+            User.email.ilike(pattern, escape='\\')
+        ))
+    pagination = q.order_by(User.id).paginate(
+        page=page_id, per_page=current_app.config['ADMIN_PAGE_SIZE'], error_out=False
+    )
+    next_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
     changed_id = changed_form.user_id.data if changed_form else None
 
-    forms = [UserForm(None, obj=user, user_id=user.id) for user in users if user.id != changed_id]
+    forms = [
+        UserForm(None, data=changed_form.data) if user.id == changed_id  # type: ignore
+        else UserForm(None, obj=user, user_id=user.id)
+        for user in pagination.items
+    ]
     new_form = NewUserForm(
             None,
             user_id=next_id,
             date_created=dt.datetime.now(),
             is_active=True
         )
-    if changed_id in user_ids:
-        # new newform or changed userform
-        user_form = UserForm(None, data=changed_form.data)  # type: ignore
-        forms += [user_form]
-    elif changed_id and changed_form.errors:  # type: ignore
+    if changed_id and changed_form.errors and not User.query.get(changed_id):  # type: ignore
         new_form = changed_form  # type: ignore
-
-    forms.sort(key=lambda x: x.data['user_id'])
-    return forms, new_form
+    return forms, new_form, pagination
 
 
 def change_user(user_form: UserForm) -> None:
@@ -1,12 +1,15 @@
 from flask import (
     Blueprint,
+    current_app,
     redirect,
     flash,
     url_for,
     render_template,
-    request
+    request,
+    jsonify
 )
 
+from db import engines
 from .utils import admin_required, make_forms, change_user, delete_user
 from .forms import UserForm, NewUserForm
 
@@ -18,6 +21,7 @@ admin_bp = Blueprint('admin', __name__, template_folder='templates', url_prefix=
 def admin():
     """
     View, change, add and delete users from this view!
+    Users are shown by pages, optionally filtered with ?q= search.
     """
     user_form = None
     if request.method == 'POST':
@@ -26,8 +30,16 @@ def admin():
         if user_form.validate_on_submit():
             change_user(user_form)
             flash(f'Change successful!')
-    forms, new_form = make_forms(user_form)
-    return render_template('admin.html', forms=forms, new_form=new_form)
+    page_id = request.args.get('page', 1, type=int)
+    search = request.args.get('q', '').strip()
+    forms, new_form, pagination = make_forms(user_form, max(page_id, 1), search)
+    return render_template(
+        'admin.html',
+        forms=forms,
+        new_form=new_form,
+        pagination=pagination,
+        search=search
+    )
 
 
 @admin_bp.route('/delete', methods=['GET'])
@@ -43,3 +55,21 @@ def delete():
     else:
         flash(f'User with id {user_id} does not exist.')
     return redirect(url_for('.admin'))
+
+
+@admin_bp.route('/jobs', methods=['GET'])
+@admin_required
+def jobs():
+    """
+    Returns history of scheduled maintenance jobs.
+    """
+    return jsonify(current_app.extensions['scheduler'].load_state())
+
+
+@admin_bp.route('/db', methods=['GET'])
+@admin_required
+def db_pool():
+    """
+    Returns connection pool statistics of DB engines.
+    """
+    return jsonify(engines.pool_stats())
@@ -1,31 +1,204 @@
+import datetime as dt
 import hashlib
 import hmac
-from typing import Dict, List, Tuple
+import json
+from time import time
+from typing import Dict, List, Tuple, Union
 
-from flask import jsonify, abort, request
+from flask import Response, jsonify, abort, request, current_app
+import jwt
 
 from config import Config
 from flask_app.base.functions import get_from_db_paginate, get_data, page_error_handler
+from flask_app.base.functions import rows_to_json, format_pos_id
 from flask_app import db_slip
+from flask_app.cache import TTLCache
 from db import Slip
-from .utils import insert_slips, rrn_exists, format_dates, get_meta
+from db.partitions import ensure_partitions, bump_versions, get_versions
+from db.stats import refresh_stats
+from .utils import insert_slips, rrn_exists, format_dates, get_meta, find_slips
+from .utils import date_range, parse_date, bulk_change, sum_stats
+
+
+__all__ = [
+    'create_token',
+    'list_slips',
+    'add_slips',
+    'lookup_slips',
+    'get_one_slip',
+    'update_one_slip',
+    'delete_one_slip',
+    'update_slips',
+    'delete_slips',
+    'list_stats',
+    'cache_stats',
+]
+
+
+def credentials_cache() -> TTLCache:
+    """
+    Returns cache of successfully verified credentials of current app,
+    creating it from app config on first call.  Digests of credentials are
+    mapped to API credentials they were checked against, so changing
+    API_USER or API_PASSWORD revokes them at once.
+    """
+    cache = current_app.extensions.get('credentials_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'credentials_cache',
+            TTLCache(current_app.config['AUTH_CACHE_SIZE'], current_app.config['AUTH_CACHE_TTL'])
+        )
+    return cache
 
 
-__all__ = ['list_slips', 'add_slips', 'get_one_slip', 'update_one_slip', 'delete_one_slip']
+def api_credentials() -> Tuple[str, str]:
+    """Returns current API user and hashed password."""
+    return current_app.config['API_USER'], current_app.config['API_PASSWORD']
 
 
 def basic_auth(username: str, password: str, required_scopes=None):
-    user_ok = hmac.compare_digest(username, Config.API_USER)
+    expected = api_credentials()
+    cache = credentials_cache()
+    key = hashlib.sha256(f'{username}:{password}'.encode('utf-8')).hexdigest()
+    if cache.get(key) == expected:
+        return {'sub': username, 'username': username, 'password': password}
+    api_user, api_password = expected
+    user_ok = hmac.compare_digest(username, api_user)
     hashed_password: str = hashlib.sha512(
         password.encode('utf-8') + Config.SECRET_KEY.encode('utf-8')
     ).hexdigest()
     pass_ok = hmac.compare_digest(
         hashed_password,
-        Config.API_PASSWORD
+        api_password
     )
     if not (user_ok and pass_ok):
         abort(401)
-    return {'username': username, 'password': password}
+    cache.set(key, expected)
+    return {'sub': username, 'username': username, 'password': password}
+
+
+def credentials_fingerprint() -> str:
+    """
+    Returns short fingerprint of current API credentials, tokens with
+    another fingerprint are revoked.
+    """
+    api_user, api_password = api_credentials()
+    return hashlib.sha256(f'{api_user}:{api_password}'.encode('utf-8')).hexdigest()[:16]
+
+
+def token_auth(token: str, required_scopes=None):
+    try:
+        payload = jwt.decode(
+            token,
+            current_app.config['SECRET_KEY'],
+            algorithms=['HS256']
+        )
+    except jwt.exceptions.InvalidTokenError:
+        return None
+    if not hmac.compare_digest(payload.get('api', ''), credentials_fingerprint()):
+        return None
+    return {'sub': payload['sub']}
+
+
+def authenticate() -> Dict[str, str]:
+    """
+    Authenticates current request with basic credentials or a bearer token,
+    as connexion does for operations with both security schemes.  Used by
+    endpoints, registered outside of connexion.  Aborts with 401 on failure.
+    """
+    auth_type, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if auth_type.lower() == 'basic' and request.authorization:
+        return basic_auth(request.authorization.username, request.authorization.password)
+    if auth_type.lower() == 'bearer':
+        token_info = token_auth(credentials.strip())
+        if token_info:
+            return token_info
+    abort(401)
+
+
+def create_token(user: str) -> Dict[str, Union[str, int]]:
+    """
+    Exchanges basic auth credentials for a bearer token.
+
+    Parameters
+    ----------
+    user
+        Username from basic auth.
+
+    Returns
+    -------
+    Dict[str, Union[str, int]]
+        Token and it's lifetime in seconds.
+
+    """
+    expires_in = current_app.config['API_TOKEN_TTL']
+    token = jwt.encode(
+        {
+            'sub': user,
+            'api': credentials_fingerprint(),
+            'exp': time() + expires_in
+        },
+        current_app.config['SECRET_KEY'],
+        algorithm='HS256'
+    ).decode('utf-8')
+    return jsonify({'token': token, 'expires_in': expires_in})
+
+
+def slips_etag(start_date: dt.date, end_date: dt.date, args: Dict) -> str:
+    """
+    Returns strong ETag for slips between dates, requested with args.
+    It's built from change counters of the months, so no slips are read.
+
+    Parameters
+    ----------
+    start_date
+        Start of the range.
+    end_date
+        End of the range.
+    args
+        Request arguments, that define response contents.
+
+    Returns
+    -------
+    str
+        ETag value without quotes.
+
+    """
+    versions = get_versions(db_slip.session, start_date, end_date)
+    key = json.dumps([args, versions], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def conditional_response(
+    etag: str,
+    make_response: callable,
+    cached: bool = False
+) -> Response:
+    """
+    Returns 304 response if client's If-None-Match matches etag, otherwise
+    builds full response with make_response.  ETag is set on both.
+    If cached, successful response body is stored in result cache by etag,
+    so other clients get it without querying slips.  ETag depends on change
+    counters, so writes to the dates make cached bodies unreachable.
+    """
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    elif cached:
+        cache = current_app.extensions['result_cache']
+        body = cache.get(etag)
+        if body is None:
+            response = make_response()
+            if response.status_code == 200:
+                cache.set(etag, response.get_data())
+        else:
+            response = current_app.response_class(
+                body,
+                mimetype=current_app.config['JSONIFY_MIMETYPE']
+            )
+    else:
+        response = make_response()
+    response.set_etag(etag)
+    return response
 
 
 def list_slips(
@@ -58,23 +231,25 @@ def list_slips(
 
     """
     args = locals()
-    if len(date) == 1:
-        start_date = end_date = date[0]
-    else:
-        start_date = min(date)
-        end_date = max(date)
+    start_date, end_date = date_range(date)
     form = {
         'object_code': object_code,
         'pos_id': pos_id,
-        'start_date': start_date,
-        'end_date': end_date
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat()
     }
-    pagination = get_from_db_paginate(form, page_id, per_page)
-    slips = get_data(pagination, page_id, per_page, error_handler=page_error_handler)
-    data = [slip.to_json() for slip in slips]
-    meta = get_meta(pagination, args, data)
-    result = {'data': data, 'meta': meta}
-    return jsonify(result)
+
+    def make_response():
+        columns = list(Slip.__table__.columns)
+        pagination = get_from_db_paginate(form, page_id, per_page, columns)
+        slips = get_data(pagination, page_id, per_page, error_handler=page_error_handler)
+        data = rows_to_json(slips, columns)
+        meta = get_meta(pagination, args, data)
+        result = {'data': data, 'meta': meta}
+        return jsonify(result)
+
+    etag = slips_etag(start_date, end_date, args)
+    return conditional_response(etag, make_response, cached=True)
 
 
 def add_slips() -> Tuple[str, int]:
@@ -88,11 +263,31 @@ def add_slips() -> Tuple[str, int]:
 
     """
     slips: List[Dict[str, str]] = request.json
-    slips_added_count = insert_slips(slips)
+    slips_added_count, slips_skipped_count = insert_slips(slips)
     if slips_added_count == 0:
         abort(409, 'All slips provided are already in db.')
     else:
-        return f'Added {slips_added_count} slips out of {len(slips)}', 201
+        return (
+            f'Added {slips_added_count} slips out of {len(slips)}, '
+            f'skipped {slips_skipped_count}',
+            201
+        )
+
+
+def lookup_slips() -> Dict[str, List[Dict[str, str]]]:
+    """
+    Finds slips for a list of (date, ref_num) pairs from JSON.
+
+    Returns
+    -------
+    Dict[str, List[Dict[str, str]]]
+        Returns JSONified found slips and pairs, that were not found.
+
+    """
+    pairs: List[Dict[str, str]] = request.json
+    columns = list(Slip.__table__.columns)
+    found, missing = find_slips(pairs, columns)
+    return jsonify({'found': rows_to_json(found, columns), 'missing': missing})
 
 
 def get_one_slip(date: str, ref_num: str) -> Dict[str, str]:
@@ -113,11 +308,16 @@ def get_one_slip(date: str, ref_num: str) -> Dict[str, str]:
         Returns JSONified dicts, representing found slip.
 
     """
-    slip = rrn_exists(date, ref_num)
-    if not slip:
-        abort(404, f'No operation found with RRN {ref_num} and {date}.')
-    result = slip.to_json()
-    return jsonify(result)
+    def make_response():
+        slip = rrn_exists(date, ref_num)
+        if not slip:
+            abort(404, f'No operation found with RRN {ref_num} and {date}.')
+        result = slip.to_json()
+        return jsonify(result)
+
+    day = parse_date(date)
+    etag = slips_etag(day, day, {'date': date, 'ref_num': ref_num})
+    return conditional_response(etag, make_response)
 
 
 def update_one_slip(
@@ -140,6 +340,7 @@ def update_one_slip(
         Message and HTTP return code.
 
     """
+    old_date = parse_date(date)
     new_slip = Slip(**format_dates(request.json)).to_dict()
     old_slip = rrn_exists(date, ref_num)
     new_link = new_slip['file_link']
@@ -149,8 +350,14 @@ def update_one_slip(
     if old_link != new_link and Slip.query.get(new_link):
         abort(409, f'Record with unique file_link {new_link} already exists.')
 
+    # Moved slip would land in the default partition otherwise.
+    ensure_partitions(db_slip.session.connection(), [new_slip['date']])
     Slip.query.filter(Slip.date == date, Slip.ref_num == ref_num).\
         update(new_slip, synchronize_session=False)
+    bump_versions(db_slip.session, [old_date, new_slip['date']])
+    for changed_date in {old_date, new_slip['date']}:
+        refresh_stats(db_slip.session, changed_date, changed_date)
+    db_slip.session.commit()
     return 'Successfully updated', 201
 
 
@@ -174,9 +381,161 @@ def delete_one_slip(
         Message and HTTP return code.
 
     """
+    parse_date(date)
     slip = rrn_exists(date, ref_num)
     if not slip:
         abort(404, f'No operation found with RRN {ref_num} and {date}.')
     db_slip.session.delete(slip)
+    bump_versions(db_slip.session, [slip.date])
+    refresh_stats(db_slip.session, slip.date, slip.date)
     db_slip.session.commit()
     return 'Deleted successfully', 204
+
+
+def bulk_form(date: List[str], object_code: str, pos_id: str) -> Dict[str, str]:
+    """
+    Builds filters for bulk operations, at least one of object_code and pos_id
+    is required to not touch all slips for the dates.
+    """
+    if not (object_code or pos_id):
+        abort(400, 'Specify object_code or pos_id.')
+    if pos_id:
+        # Unparsable pos_id would turn into "pos_id IS NULL" filter.
+        pos_id = format_pos_id(pos_id)
+        if pos_id is None:
+            abort(400, 'Invalid pos_id.')
+    start_date, end_date = date_range(date)
+    return {
+        'object_code': object_code,
+        'pos_id': pos_id,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat()
+    }
+
+
+def bulk_values(values: Dict[str, str]) -> Dict[str, str]:
+    """
+    Normalises new values for bulk update the same way filters are, so
+    updated slips can be found by them.
+    """
+    values = dict(values)
+    if values.get('object_code'):
+        values['object_code'] = values['object_code'].upper()
+    if 'pos_id' in values:
+        values['pos_id'] = format_pos_id(values['pos_id'])
+        if values['pos_id'] is None:
+            abort(400, 'Invalid pos_id.')
+    return values
+
+
+def update_slips(
+    date: List[str],
+    object_code: str = '',
+    pos_id: str = ''
+) -> Dict[str, int]:
+    """
+    Updates all slips, filtered with date, object_code and pos_id,
+    with values from JSON.
+
+    Parameters
+    ----------
+    date
+        List of dates (1 or 2) to filter with.
+    object_code
+        SAP object code to filter with.
+    pos_id
+        POS-terminal ID to filter with.
+
+    Returns
+    -------
+    Dict[str, int]
+        Returns JSONified number of updated slips.
+
+    """
+    form = bulk_form(date, object_code, pos_id)
+    values = {**bulk_values(request.json), 'updated': dt.date.today()}
+    return jsonify({'affected': bulk_change(form, values)})
+
+
+def delete_slips(
+    date: List[str],
+    object_code: str = '',
+    pos_id: str = ''
+) -> Dict[str, int]:
+    """
+    Deletes all slips, filtered with date, object_code and pos_id.
+
+    Parameters
+    ----------
+    date
+        List of dates (1 or 2) to filter with.
+    object_code
+        SAP object code to filter with.
+    pos_id
+        POS-terminal ID to filter with.
+
+    Returns
+    -------
+    Dict[str, int]
+        Returns JSONified number of deleted slips.
+
+    """
+    form = bulk_form(date, object_code, pos_id)
+    return jsonify({'affected': bulk_change(form)})
+
+
+def list_stats(
+    date: List[str],
+    object_code: str = '',
+    pos_id: str = '',
+    group_by: List[str] = None
+) -> List[Dict[str, Union[str, int, float, dict]]]:
+    """
+    Returns totals of slips, filtered with date, object_code and pos_id,
+    from precomputed daily aggregates.
+
+    Parameters
+    ----------
+    date
+        List of dates (1 or 2) to filter with.
+    object_code
+        SAP object code to filter with, optional.
+    pos_id
+        POS-terminal ID to filter with, optional.
+    group_by
+        Fields to group totals by, date, object_code and pos_id by default.
+
+    Returns
+    -------
+    List[Dict[str, Union[str, int, float, dict]]]
+        Returns JSONified totals with breakdown by operation type.
+
+    """
+    args = locals()
+    start_date, end_date = date_range(date)
+    group_by = group_by or ['date', 'object_code', 'pos_id']
+    form = {
+        'object_code': object_code,
+        'pos_id': pos_id,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat()
+    }
+    # Totals change together with slips, so slips ETag is valid for them too.
+    etag = slips_etag(start_date, end_date, {'stats': args})
+    return conditional_response(etag, lambda: jsonify(sum_stats(form, group_by)))
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Returns counters of API caches for monitoring.
+
+    Returns
+    -------
+    Dict[str, Dict[str, int]]
+        Returns JSONified hits, misses and sizes of caches.
+
+    """
+    return jsonify({
+        'results': current_app.extensions['result_cache'].stats(),
+        'credentials': credentials_cache().stats(),
+    })
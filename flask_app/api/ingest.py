@@ -0,0 +1,124 @@
+import json
+from functools import lru_cache
+from typing import Dict, List, Union
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from jsonschema import Draft4Validator, RefResolver
+import yaml
+
+from .api import authenticate
+from .utils import insert_slips, format_dates, INSERT_CHUNK_SIZE
+
+
+# Plain Flask blueprint - connexion reads whole request body into memory
+# before calling the handler, so streaming endpoint can't be served by it.
+ingest_bp = Blueprint('ingest', __name__, url_prefix='/api')
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Maximum number of per-line errors included in response.
+MAX_REPORTED_ERRORS = 100
+
+
+@lru_cache(maxsize=None)
+def get_slip_validator(schema_path: str) -> Draft4Validator:
+    """
+    Returns validator for SlipModel from OpenAPI schema, that is used by
+    connexion for JSON endpoints.
+
+    Parameters
+    ----------
+    schema_path
+        Path to OpenAPI schema.
+
+    Returns
+    -------
+    Draft4Validator
+        Validator for one slip.
+
+    """
+    with open(schema_path, encoding='utf-8') as f:
+        spec = yaml.safe_load(f)
+    schema = spec['components']['schemas']['SlipModel']
+    return Draft4Validator(schema, resolver=RefResolver('', spec, store={'': spec}))
+
+
+def parse_line(
+    line: bytes,
+    validator: Draft4Validator
+) -> Dict[str, str]:
+    """
+    Parses and validates one line of NDJSON upload.
+
+    Parameters
+    ----------
+    line
+        One JSON document.
+    validator
+        SlipModel validator.
+
+    Returns
+    -------
+    Dict[str, str]
+        Slip attributes.
+
+    Raises
+    ------
+    ValueError
+        If line is not valid JSON or not a valid slip.
+
+    """
+    slip = json.loads(line)
+    error = next(validator.iter_errors(slip), None)
+    if error:
+        path = '.'.join(map(str, error.path))
+        raise ValueError(f'{path}: {error.message}' if path else error.message)
+    # Checks dates and time are real, not just matching the patterns.
+    format_dates(slip)
+    return slip
+
+
+@ingest_bp.route('/slips/ndjson', methods=['POST'])
+def add_slips_ndjson() -> Response:
+    """
+    Adds slips from newline delimited JSON body, one slip per line.
+    Lines are parsed, validated and inserted in chunks while the body is read,
+    so memory usage doesn't depend on upload size.  Invalid lines are
+    skipped and reported in response together with added and skipped counts.
+    """
+    authenticate()
+    if request.mimetype != NDJSON_MIMETYPE:
+        abort(415, f'Content-Type should be {NDJSON_MIMETYPE}.')
+
+    validator = get_slip_validator(current_app.config['SCHEMA_PATH'])
+    counters = {'added': 0, 'skipped': 0, 'invalid': 0}
+    errors: List[Dict[str, Union[int, str]]] = []
+    chunk: List[Dict[str, str]] = []
+
+    def flush():
+        added, skipped = insert_slips(chunk)
+        counters['added'] += added
+        counters['skipped'] += skipped
+        chunk.clear()
+
+    for line_num, line in enumerate(request.stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            chunk.append(parse_line(line, validator))
+        except ValueError as e:
+            counters['invalid'] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'line': line_num, 'error': str(e)})
+            continue
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+
+    if counters['added']:
+        status = 201
+    elif counters['invalid']:
+        status = 400
+    else:
+        status = 409
+    return jsonify({**counters, 'errors': errors}), status
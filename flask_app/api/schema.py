@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict
+
+import yaml
+
+
+def load_schema(schema_path: str, cache_path: str = None) -> Dict[str, Any]:
+    """
+    Loads OpenAPI schema from YAML file.  Parsed schema is cached to
+    cache_path as JSON together with hash of the YAML source, so next
+    workers skip slow YAML parsing until the source changes.
+
+    Parameters
+    ----------
+    schema_path
+        Path to OpenAPI schema in YAML.
+    cache_path
+        Path to JSON cache, caching is disabled if not set.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Parsed schema, ready for connexion add_api.
+
+    """
+    with open(schema_path, 'rb') as f:
+        source = f.read()
+    source_hash = hashlib.sha256(source).hexdigest()
+    if cache_path:
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache['source_hash'] == source_hash:
+                return cache['spec']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    spec = yaml.safe_load(source.decode('utf-8'))
+    if cache_path:
+        try:
+            with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=os.path.dirname(os.path.abspath(cache_path)),
+                suffix='.tmp', delete=False
+            ) as f:
+                json.dump({'source_hash': source_hash, 'spec': spec}, f)
+            os.replace(f.name, cache_path)
+        except OSError:
+            pass
+    return spec
+
+
+def connexion_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns schema without paths, marked with x-blueprint.  Such paths are
+    served by plain Flask blueprints and are in the schema for documentation.
+
+    Parameters
+    ----------
+    spec
+        Parsed OpenAPI schema.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Schema to pass to connexion add_api.
+
+    """
+    paths = {
+        path: item for path, item in spec['paths'].items()
+        if not item.get('x-blueprint')
+    }
+    return {**spec, 'paths': paths}
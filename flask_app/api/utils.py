@@ -1,13 +1,23 @@
-from typing import Dict, List, Union
+from typing import Dict, List, Tuple, Union
 from urllib.parse import urlencode
 
+from flask import abort
 from flask_sqlalchemy import Pagination
+from sqlalchemy import Column
+import sqlalchemy.sql.functions as func
 
 from datetime import datetime
 import datetime as dt
 
 from flask_app import db_slip
-from db import try_query, Slip
+from db import try_query, Slip, SlipStat
+from db.partitions import ensure_partitions, month_bounds, bump_versions
+from db.stats import add_stats, refresh_stats
+from flask_app.base.functions import get_filtered_query, format_pos_id
+
+
+# Keeps IN-lists below SQLite limit of 999 bound parameters.
+INSERT_CHUNK_SIZE = 500
 
 
 def get_meta(
@@ -57,6 +67,128 @@ def get_meta(
     return meta
 
 
+def parse_date(value: str) -> dt.date:
+    """
+    Parses date in format '%Y-%m-%d'.  Schema checks the format only, so
+    impossible dates like 2020-02-30 are rejected here with 400.
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        abort(400, f'Invalid date {value}.')
+
+
+def date_range(date: List[str]) -> Tuple[dt.date, dt.date]:
+    """
+    Returns start and end dates from the list of one or two dates.
+    """
+    dates = [parse_date(value) for value in date]
+    return min(dates), max(dates)
+
+
+def bulk_change(
+    form: Dict[str, str],
+    values: Dict[str, str] = None
+) -> int:
+    """
+    Updates slips, matching form, with values or deletes them, if values are
+    not set.  Runs one set-based statement per month of the date range,
+    committing after each, so locks are held for a short time.
+
+    Parameters
+    ----------
+    form
+        Filters, see functions.get_filtered_query.  start_date and end_date
+        are required.
+    values
+        New values for Slip columns.
+
+    Returns
+    -------
+    int
+        Number of affected rows.
+
+    """
+    start = parse_date(form['start_date'])
+    end = parse_date(form['end_date'])
+    counter = 0
+    for lower, upper in month_bounds(start, end):
+        month_form = {
+            **form,
+            'start_date': max(start, lower).isoformat(),
+            'end_date': min(end, upper - dt.timedelta(days=1)).isoformat(),
+        }
+        q = get_filtered_query(month_form)
+        if values:
+            affected = q.update(values, synchronize_session=False)
+        else:
+            affected = q.delete(synchronize_session=False)
+        if affected:
+            bump_versions(db_slip.session, [lower])
+            refresh_stats(
+                db_slip.session,
+                dt.date.fromisoformat(month_form['start_date']),
+                dt.date.fromisoformat(month_form['end_date'])
+            )
+        counter += affected
+        db_slip.session.commit()
+    return counter
+
+
+def sum_stats(
+    form: Dict[str, str],
+    group_by: List[str]
+) -> List[Dict[str, Union[str, int, float, dict]]]:
+    """
+    Sums daily totals, matching form, by group_by fields and operation type.
+
+    Parameters
+    ----------
+    form
+        Filters: start_date and end_date are required, object_code
+        and pos_id are optional.
+    group_by
+        SlipStat fields: 'date', 'object_code' and/or 'pos_id'.
+
+    Returns
+    -------
+    List[Dict[str, Union[str, int, float, dict]]]
+        Totals for every group with breakdown by operation type.
+
+    """
+    columns = [getattr(SlipStat, field) for field in group_by]
+    q = db_slip.session.query(
+        *columns,
+        SlipStat.operation_type,
+        func.sum(SlipStat.count),
+        func.sum(SlipStat.summ)
+    ).filter(SlipStat.date.between(form['start_date'], form['end_date']))
+    # Normalised the same way, as get_filtered_query does for slips.
+    if form.get('object_code'):
+        q = q.filter(SlipStat.object_code == form['object_code'].upper())
+    if form.get('pos_id'):
+        q = q.filter(SlipStat.pos_id == format_pos_id(form['pos_id']))
+    q = q.group_by(*columns, SlipStat.operation_type). \
+        order_by(*columns, SlipStat.operation_type).all
+
+    groups = {}
+    for *key, operation_type, count, summ in try_query(q):
+        group = groups.get(tuple(key))
+        if group is None:
+            group = groups[tuple(key)] = {
+                **{field: str(value) for field, value in zip(group_by, key)},
+                'count': 0,
+                'summ': 0.0,
+                'operations': {}
+            }
+        group['count'] += count
+        group['summ'] += summ
+        group['operations'][operation_type] = {'count': count, 'summ': round(summ, 2)}
+    for group in groups.values():
+        group['summ'] = round(group['summ'], 2)
+    return list(groups.values())
+
+
 def rrn_exists(date: str, ref_num: str) -> Union[Slip, bool]:
     """
     Finds a row in DB filtered by date and ref_num.
@@ -78,6 +210,58 @@ def rrn_exists(date: str, ref_num: str) -> Union[Slip, bool]:
     return try_query(q)
 
 
+def find_slips(
+    pairs: List[Dict[str, str]],
+    columns: List[Column],
+    chunk_size: int = INSERT_CHUNK_SIZE
+) -> Tuple[List[tuple], List[Dict[str, str]]]:
+    """
+    Finds rows in DB for many (date, ref_num) pairs at once, with one query
+    per chunk of pairs.
+
+    Parameters
+    ----------
+    pairs
+        List of dicts with 'date' in format '%Y-%m-%d' and 'ref_num' keys.
+    columns
+        Slip columns to select, must include date and ref_num.
+    chunk_size
+        Number of pairs looked up with one query.
+
+    Returns
+    -------
+    Tuple[List[tuple], List[Dict[str, str]]]
+        Found rows and pairs, that were not found.
+
+    """
+    keys = {}
+    for pair in pairs:
+        key = (parse_date(pair['date']), int(pair['ref_num']))
+        keys.setdefault(key, pair)
+    keys_list = list(keys)
+    date_idx = columns.index(Slip.__table__.c.date)
+    ref_num_idx = columns.index(Slip.__table__.c.ref_num)
+
+    found = []
+    found_keys = set()
+    for i in range(0, len(keys_list), chunk_size):
+        chunk = keys_list[i:i + chunk_size]
+        dates = {date for date, _ in chunk}
+        ref_nums = {ref_num for _, ref_num in chunk}
+        # Date and RRN are filtered separately, so rows from "crossed"
+        # pairs are possible and dropped below.
+        q = db_slip.session.query(*columns). \
+            filter(Slip.date.in_(dates), Slip.ref_num.in_(ref_nums)).all
+        chunk_keys = set(chunk)
+        for row in try_query(q):
+            key = (row[date_idx], int(row[ref_num_idx]))
+            if key in chunk_keys:
+                found.append(row)
+                found_keys.add(key)
+    missing = [pair for key, pair in keys.items() if key not in found_keys]
+    return found, missing
+
+
 def format_dates(
     slip: Dict[str, str]
 ) -> Dict[str, Union[str, dt.date, dt.time]]:
@@ -105,30 +289,43 @@ def format_dates(
     }
 
 
-def insert_slips(dicts: List[Dict[str, str]]) -> int:
+def insert_slips(
+    dicts: List[Dict[str, str]],
+    chunk_size: int = INSERT_CHUNK_SIZE
+) -> Tuple[int, int]:
     """
     Validates and inserts valid slips from dicts to the DB.
+    Slips with file_link, already present in DB or earlier in dicts, are skipped.
+    Existing links are looked up with one IN-query per chunk, new slips are
+    inserted in bulk.
 
     Parameters
     ----------
-    slips
+    dicts
         List of dicts, representing Slip attributes.
+    chunk_size
+        Number of slips checked and inserted at once.
 
     Returns
     -------
-    int
-        Returns ammount of inserted slips from the list.
+    Tuple[int, int]
+        Returns ammount of inserted and skipped slips from the list.
 
     """
     counter_add = 0
-    unique_dicts = {d['file_link']: d for d in dicts}.values()
-    filtered_dicts = [d for d in unique_dicts
-                      if not Slip.query.get(d['file_link'])]
-
-    for dct in filtered_dicts:
-        slip = Slip(**format_dates(dct))
-        db_slip.session.add(slip)
-        counter_add += 1
-    db_slip.session.commit()
+    unique_dicts = list({d['file_link']: d for d in dicts}.values())
+    session = db_slip.session
+    for i in range(0, len(unique_dicts), chunk_size):
+        chunk = unique_dicts[i:i + chunk_size]
+        links = [d['file_link'] for d in chunk]
+        q = session.query(Slip.file_link).filter(Slip.file_link.in_(links)).all
+        existing = {link for link, in try_query(q)}
+        new_slips = [format_dates(d) for d in chunk if d['file_link'] not in existing]
+        ensure_partitions(session.connection(), (d['date'] for d in new_slips))
+        session.bulk_insert_mappings(Slip, new_slips)
+        bump_versions(session, (d['date'] for d in new_slips))
+        add_stats(session, new_slips)
+        counter_add += len(new_slips)
+    session.commit()
 
-    return counter_add
+    return counter_add, len(dicts) - counter_add
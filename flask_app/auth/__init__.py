@@ -1,14 +1,13 @@
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_mail import Mail
 from flask import Flask, Blueprint
 
+from flask_app.database import SQLAlchemy
+
 auth = Blueprint('auth', __name__, template_folder='templates')
 auth.config = {}
 
 db = SQLAlchemy()
-migrate = Migrate()
 login = LoginManager()
 mail = Mail()
 
@@ -32,9 +31,13 @@ def init_app(app: Flask) -> None:
 
         app.register_blueprint(auth)
         db.init_app(app)
-        migrate.init_app(app, db)
+        # Alembic is heavy, import it only for apps, not for models.
+        from flask_migrate import Migrate
+        Migrate(app, db)
 
         login.init_app(app)
         login.login_view = 'auth.login'
 
         mail.init_app(app)
+        from .mail_queue import mail_queue
+        mail_queue.init_app(app)
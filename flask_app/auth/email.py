@@ -3,7 +3,8 @@ from typing import List
 from flask_mail import Message
 from flask import render_template
 
-from . import mail, auth, models
+from . import auth, models
+from .mail_queue import mail_queue
 
 
 def send_email(
@@ -14,7 +15,8 @@ def send_email(
     html_body: str
 ) -> None:
     """
-    Wrapper for Flask-Mail in one function.
+    Wrapper for Flask-Mail in one function.  E-mail is queued and sent
+    in background, so it doesn't wait for mail server.
 
     Parameters
     ----------
@@ -32,13 +34,13 @@ def send_email(
     Returns
     -------
     None
-        Just sends the specified e-mail.
+        Just queues the specified e-mail.
 
     """
     msg = Message(subject, sender=sender, recipients=recipients)
     msg.body = text_body
     msg.html = html_body
-    mail.send(msg)
+    mail_queue.put(msg)
 
 
 def send_password_reset_email(user: models.User) -> None:
@@ -0,0 +1,220 @@
+import json
+import os
+import os.path as pth
+import smtplib
+import tempfile
+import uuid
+from threading import Event, Thread
+from time import time
+from typing import Any, Dict, List, Tuple
+
+from flask import Flask, current_app
+from flask_mail import Connection, Message
+from loguru import logger
+
+
+class TimeoutConnection(Connection):
+    """
+    Flask-Mail connection with socket timeout, so slow mail server can't
+    block the sender forever.
+    """
+    def __init__(self, mail, timeout: float):
+        super().__init__(mail)
+        self.timeout = timeout
+
+    def configure_host(self) -> smtplib.SMTP:
+        smtp_class = smtplib.SMTP_SSL if self.mail.use_ssl else smtplib.SMTP
+        host = smtp_class(self.mail.server, self.mail.port, timeout=self.timeout)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+
+class MailQueue:
+    """
+    Outbound e-mail queue, kept in a local directory, so views don't wait
+    for mail server and queued messages survive restarts:
+
+    - <id>.json - message waiting to be sent, with attempts counter and
+      time of the next attempt;
+    - <id>.sending - message claimed by a sender;
+    - <id>.failed - message, that wasn't sent after MAIL_MAX_ATTEMPTS.
+
+    Background sender sends ready messages in batches over one SMTP
+    connection, failed messages are retried with exponential delay.
+    Messages are claimed with atomic rename, so every process may run
+    a sender.
+
+    Parameters
+    ----------
+    app
+        Flask application, can be set later with init_app.
+
+    """
+    def __init__(self, app: Flask = None):
+        self.wakeup = Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Creates queue directory and registers the queue in the app."""
+        os.makedirs(app.config['MAIL_QUEUE_DIR'], exist_ok=True)
+        app.extensions['mail_queue'] = self
+
+    @property
+    def queue_dir(self) -> str:
+        return current_app.config['MAIL_QUEUE_DIR']
+
+    def path(self, message_id: str, suffix: str) -> str:
+        return pth.join(self.queue_dir, message_id + suffix)
+
+    def put(self, message: Message) -> str:
+        """
+        Queues message for sending.
+
+        Parameters
+        ----------
+        message
+            Flask-Mail message with subject, sender, recipients and bodies.
+
+        Returns
+        -------
+        str
+            Message ID.
+
+        """
+        # Time prefix keeps messages roughly in order of queueing.
+        message_id = f'{time():.6f}-{uuid.uuid4().hex}'
+        self.write(message_id, {
+            'subject': message.subject,
+            'sender': message.sender,
+            'recipients': message.recipients,
+            'body': message.body,
+            'html': message.html,
+            'attempts': 0,
+            'next_attempt': 0,
+        })
+        self.wakeup.set()
+        return message_id
+
+    def write(self, message_id: str, data: Dict[str, Any]) -> None:
+        """Writes queued message atomically."""
+        # Unique temporary file, so threads of one process don't mix writes.
+        with tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', dir=self.queue_dir, prefix=f'{message_id}.',
+            suffix='.tmp', delete=False
+        ) as f:
+            json.dump(data, f)
+        os.replace(f.name, self.path(message_id, '.json'))
+
+    def claim(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Claims up to limit messages, that are ready to be sent.
+        Claims, left by dead senders, are returned to the queue first.
+        """
+        now = time()
+        claimed = []
+        for name in sorted(os.listdir(self.queue_dir)):
+            message_id, suffix = pth.splitext(name)
+            path = pth.join(self.queue_dir, name)
+            if suffix == '.sending':
+                try:
+                    if now - pth.getmtime(path) > current_app.config['MAIL_CLAIM_TIMEOUT']:
+                        os.replace(path, self.path(message_id, '.json'))
+                except FileNotFoundError:
+                    pass
+                continue
+            if suffix != '.json' or len(claimed) >= limit:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+                if data['next_attempt'] > now:
+                    continue
+                os.rename(path, self.path(message_id, '.sending'))
+            except (FileNotFoundError, ValueError):
+                # Claimed by another sender or is being written.
+                continue
+            # Refreshes mtime, so the claim isn't taken for a stale one.
+            os.utime(self.path(message_id, '.sending'))
+            claimed.append((message_id, data))
+        return claimed
+
+    def flush(self) -> int:
+        """
+        Sends one batch of ready messages over one connection.
+
+        Returns
+        -------
+        int
+            Number of sent messages.
+
+        """
+        config = current_app.config
+        batch = self.claim(config['MAIL_BATCH_SIZE'])
+        if not batch:
+            return 0
+        sent = 0
+        try:
+            with TimeoutConnection(current_app.extensions['mail'], config['MAIL_TIMEOUT']) as conn:
+                for message_id, data in batch:
+                    message = Message(
+                        data['subject'],
+                        sender=data['sender'],
+                        recipients=data['recipients'],
+                        body=data['body'],
+                        html=data['html']
+                    )
+                    try:
+                        conn.send(message)
+                    except (smtplib.SMTPException, OSError) as e:
+                        self.retry(message_id, data, e)
+                        continue
+                    os.remove(self.path(message_id, '.sending'))
+                    sent += 1
+        except (smtplib.SMTPException, OSError) as e:
+            # Connection failed, unsent messages of the batch are retried.
+            for message_id, data in batch:
+                if pth.exists(self.path(message_id, '.sending')):
+                    self.retry(message_id, data, e)
+        logger.info(f'Sent {sent} of {len(batch)} queued e-mails.')
+        return sent
+
+    def retry(self, message_id: str, data: Dict[str, Any], error: Exception) -> None:
+        """Returns message to the queue with delay or marks it failed."""
+        config = current_app.config
+        data = {**data, 'attempts': data['attempts'] + 1, 'error': repr(error)}
+        sending_path = self.path(message_id, '.sending')
+        if data['attempts'] >= config['MAIL_MAX_ATTEMPTS']:
+            logger.error(f'E-mail {message_id} to {data["recipients"]} failed: {error!r}')
+            with open(self.path(message_id, '.failed'), 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        else:
+            logger.warning(f'E-mail {message_id} will be retried: {error!r}')
+            data['next_attempt'] = time() + config['MAIL_RETRY_DELAY'] * 2 ** (data['attempts'] - 1)
+            self.write(message_id, data)
+        os.remove(sending_path)
+
+    def run(self, app: Flask) -> None:
+        """Sends queued messages forever.  Runs in a background thread."""
+        with app.app_context():
+            while True:
+                try:
+                    while self.flush():
+                        pass
+                except Exception:
+                    logger.exception('Mail queue sender failed.')
+                self.wakeup.wait(app.config['MAIL_POLL_INTERVAL'])
+                self.wakeup.clear()
+
+    def start(self, app: Flask) -> Thread:
+        """Starts background sender for the app."""
+        thread = Thread(target=self.run, args=(app,), name='mail_queue', daemon=True)
+        thread.start()
+        return thread
+
+
+mail_queue = MailQueue()
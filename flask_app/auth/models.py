@@ -1,10 +1,16 @@
 from time import time
 from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.orm.session import SessionTransaction
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 
+from config import Config
+from flask_app.cache import TTLCache
 from . import db, login
 from . import auth
 
@@ -14,7 +20,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column('username', db.String(64), unique=True, index=True, nullable=False)
     email = db.Column('email', db.String(128), unique=True, index=True, nullable=False)
-    password_hash = db.Column('password', db.String(128), nullable=False)
+    password_hash = db.Column('password', db.String(256), nullable=False)
     is_verified = db.Column('is_verified', db.Boolean(), default=False, nullable=False)
     is_active = db.Column('is_active', db.Boolean(), default=False, nullable=False)
     is_admin = db.Column('is_admin', db.Boolean(), default=False, nullable=False)
@@ -25,10 +31,19 @@ class User(UserMixin, db.Model):
         return f'User {self.username}'
 
     def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
+        method, salt_length = password_policy()
+        self.password_hash = generate_password_hash(password, method, salt_length)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        """
+        Checks password and rehashes it with current policy, if the hash was
+        made with another one.  Caller should commit the session.
+        """
+        if not check_password_hash(self.password_hash, password):
+            return False
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     def get_reset_password_token(self, expires_in: int = 600) -> str:
         token = jwt.encode(
@@ -74,6 +89,101 @@ class User(UserMixin, db.Model):
         return User.query.get(id)
 
 
+def password_policy() -> Tuple[str, int]:
+    """
+    Returns werkzeug hashing method with cost and salt length from config.
+    """
+    config = auth.config or vars(Config)
+    method = config['PASSWORD_HASH_METHOD']
+    if method.startswith('pbkdf2:'):
+        method = f'{method}:{config["PASSWORD_HASH_ITERATIONS"]}'
+    return method, config['PASSWORD_SALT_LENGTH']
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """
+    Checks if password_hash was made with method or salt length,
+    different from current policy.
+    """
+    method, salt_length = password_policy()
+    if password_hash.count('$') < 2:
+        return True
+    hash_method, salt, _ = password_hash.split('$', 2)
+    return hash_method != method or len(salt) != salt_length
+
+
+class UserCache(TTLCache):
+    """
+    Short living cache of user records for login manager, so authenticated
+    requests don't query user DB.  Records are kept as dicts and loaded as
+    detached instances, so they never shadow fresh rows in the session.
+
+    Every invalidation bumps the generation, so a record read from DB
+    before concurrent change isn't cached after it.  Other processes see
+    changes after ttl.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        super().__init__(maxsize, ttl)
+        self.generation = 0
+
+    def load(self, user_id: int) -> Optional[User]:
+        """Returns user from cache or DB, None if user doesn't exist."""
+        generation = self.generation
+        cached = self.get(user_id)
+        if cached:
+            user = User(**cached)
+            make_transient_to_detached(user)
+            return user
+        user = User.query.get(user_id)
+        if user and self.generation == generation:
+            self.set(user_id, self.snapshot(user))
+            # Invalidation between the check and set would be lost otherwise.
+            if self.generation != generation:
+                self.pop(user_id)
+        return user
+
+    @staticmethod
+    def snapshot(user: User) -> Dict[str, Any]:
+        """Returns column attributes of user."""
+        return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+    def invalidate(self, user_id: int) -> None:
+        """Bumps the generation and drops user's record."""
+        with self._lock:
+            self.generation += 1
+        self.pop(user_id)
+
+
+user_cache = UserCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def collect_changed_user(mapper, connection, target: User) -> None:
+    """
+    Remembers ids of users, changed through ORM: admin changes, password
+    resets and e-mail verification.  Their records are invalidated after
+    commit, so concurrent requests can't cache them before it.
+    """
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_users(session: Session) -> None:
+    """Invalidates cached records of users, changed in committed transaction."""
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_changed_users(session: Session, transaction: SessionTransaction) -> None:
+    """Forgets changed users, when outermost transaction is rolled back."""
+    if transaction.parent is None:
+        session.info.pop('changed_users', None)
+
+
 @login.user_loader
 def load_user(id: str) -> User:
-    return User.query.get(int(id))
+    return user_cache.load(int(id))
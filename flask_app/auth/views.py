@@ -36,6 +36,8 @@ def login():
         elif not user.is_verified:
             flash('Email not verified, check your mailbox.')
         else:
+            # Saves password hash, upgraded by check_password.
+            db.session.commit()
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             if not next_page or url_parse(next_page).netloc != '':
@@ -141,7 +143,7 @@ def verify_mail(token: str):
     if not user:
         flash('Email verification token is tampered.')
         return redirect(url_for('views.index'))
-    user.verified = True
+    user.is_verified = True
     db.session.commit()
     flash('Your email is verified, you can login.')
     return redirect(url_for('.login'))
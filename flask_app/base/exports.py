@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import os.path as pth
+import re
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Dict, Optional, Union
+
+from flask import Flask, current_app, url_for
+from loguru import logger
+
+from . import functions
+
+
+class ExportJobs:
+    """
+    Runs full exports of search results in background threads and keeps
+    resulting files on local disk for reuse.  State of every job is kept in
+    the file system, so all gunicorn workers see the same jobs:
+
+    - <job_id>.json - job description with token of the current run,
+      written on submit;
+    - <job_id>.<token>.part - file being written by the run;
+    - <job_id> - finished file;
+    - <job_id>.error - error message, if job failed.
+
+    A run publishes it's file only while it's token is in the description,
+    so a slow run, whose job was resubmitted as failed, can't replace the
+    file of the newer run.
+
+    Job ID is derived from the search form and file format, so identical
+    queries share one file while it's younger than EXPORT_TTL.
+
+    Parameters
+    ----------
+    app
+        Flask application, can be set later with init_app.
+
+    """
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Creates thread pool for the app and export directory."""
+        app.extensions['exports'] = ThreadPoolExecutor(
+            max_workers=app.config['EXPORT_WORKERS'],
+            thread_name_prefix='export'
+        )
+        os.makedirs(app.config['EXPORT_DIR'], exist_ok=True)
+
+    @property
+    def export_dir(self) -> str:
+        return current_app.config['EXPORT_DIR']
+
+    @property
+    def ttl(self) -> int:
+        return current_app.config['EXPORT_TTL']
+
+    @staticmethod
+    def job_id(form: Dict[str, str], file_format: str) -> str:
+        """
+        Returns job ID for the search form and file format.
+        """
+        key = json.dumps([form, file_format], sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def is_valid(job_id: str) -> bool:
+        """Checks job_id has the format of job_id(), so it's a safe file name."""
+        return re.fullmatch('[0-9a-f]{32}', job_id) is not None
+
+    def path(self, job_id: str, suffix: str = '') -> str:
+        """Returns path to the job file with suffix."""
+        return pth.join(self.export_dir, job_id + suffix)
+
+    def is_fresh(self, path: str) -> bool:
+        """Checks if path exists and is younger than ttl."""
+        try:
+            return time() - pth.getmtime(path) < self.ttl
+        except OSError:
+            return False
+
+    def status(self, job_id: str) -> Optional[str]:
+        """
+        Returns job status: 'pending', 'running', 'done', 'failed'
+        or None if job is unknown, expired or job_id is malformed.
+        """
+        if not self.is_valid(job_id):
+            return None
+        if not self.is_fresh(self.path(job_id, '.json')):
+            return None
+        if pth.exists(self.path(job_id, '.error')):
+            return 'failed'
+        part_path = self.path(job_id, f'.{self.token(job_id)}.part')
+        if pth.exists(part_path):
+            # Part file, that is not touched for ttl, is left by dead worker.
+            return 'running' if self.is_fresh(part_path) else 'failed'
+        if pth.exists(self.path(job_id)):
+            return 'done'
+        return 'pending'
+
+    def token(self, job_id: str) -> Optional[str]:
+        """Returns token of the current run of the job."""
+        try:
+            with open(self.path(job_id, '.json')) as f:
+                return json.load(f).get('token')
+        except (OSError, ValueError):
+            return None
+
+    def describe(self, job_id: str) -> Optional[Dict[str, Union[str, int, None]]]:
+        """
+        Returns JSON serializable job description or None if job is unknown.
+        """
+        status = self.status(job_id)
+        if not status:
+            return None
+        with open(self.path(job_id, '.json')) as f:
+            meta = json.load(f)
+        size = pth.getsize(self.path(job_id)) if status == 'done' else None
+        error = None
+        if status == 'failed' and pth.exists(self.path(job_id, '.error')):
+            with open(self.path(job_id, '.error')) as f:
+                error = f.read()
+        return {
+            'id': job_id,
+            'status': status,
+            'format': meta['format'],
+            'size': size,
+            'error': error,
+            'url': url_for('views.export_file', job_id=job_id) if status == 'done' else None,
+        }
+
+    def submit(self, form: Dict[str, str], file_format: str) -> str:
+        """
+        Starts new export job for the form, unless the same job is already
+        running or it's file is fresh enough.
+
+        Parameters
+        ----------
+        form
+            Search form, see functions.get_filtered_query.
+        file_format
+            Key from functions.export_formats.
+
+        Returns
+        -------
+        str
+            Job ID.
+
+        """
+        self.prune()
+        job_id = self.job_id(form, file_format)
+        if self.status(job_id) in ('pending', 'running', 'done'):
+            return job_id
+        # Part file of the previous run is left to it, the run removes it.
+        for suffix in ('', '.error'):
+            self.remove(self.path(job_id, suffix))
+
+        token = uuid.uuid4().hex
+        with tempfile.NamedTemporaryFile(
+            'w', dir=self.export_dir, prefix=f'{job_id}.', suffix='.tmp', delete=False
+        ) as f:
+            json.dump({'form': form, 'format': file_format, 'created': time(), 'token': token}, f)
+        os.replace(f.name, self.path(job_id, '.json'))
+        if self.token(job_id) != token:
+            # Concurrent submit from another worker won.
+            return job_id
+        fd = os.open(self.path(job_id, f'.{token}.part'), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        app = current_app._get_current_object()
+        app.extensions['exports'].submit(self.run, app, job_id, token, form, file_format, fd)
+        return job_id
+
+    def run(
+        self,
+        app: Flask,
+        job_id: str,
+        token: str,
+        form: Dict[str, str],
+        file_format: str,
+        fd: int
+    ) -> None:
+        """
+        Writes export file chunk by chunk.  Runs in a background thread.
+        """
+        with app.app_context():
+            part_path = self.path(job_id, f'.{token}.part')
+            start = time()
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    query = functions.get_filtered_query(form)
+                    for chunk in functions.stream_query_file(query, file_format):
+                        f.write(chunk)
+            except Exception as e:
+                logger.exception(f'Export {job_id} failed.')
+                if self.token(job_id) == token:
+                    with open(self.path(job_id, '.error'), 'w') as f:
+                        f.write(repr(e))
+                self.remove(part_path)
+                return
+            if self.token(job_id) != token:
+                logger.warning(f'Export {job_id} was restarted, result of the old run is dropped.')
+                self.remove(part_path)
+                return
+            os.replace(part_path, self.path(job_id))
+            logger.info(f'Export {job_id} is done in {time() - start:.1f} seconds.')
+
+    def prune(self) -> int:
+        """
+        Removes files of expired jobs.
+
+        Returns
+        -------
+        int
+            Number of removed files.
+
+        """
+        counter = 0
+        for entry in os.scandir(self.export_dir):
+            if time() - entry.stat().st_mtime > self.ttl:
+                counter += self.remove(entry.path)
+        return counter
+
+    @staticmethod
+    def remove(path: str) -> bool:
+        """Removes file, returns True if it existed."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+exports = ExportJobs()
@@ -1,20 +1,35 @@
 import csv
+import importlib.util
 import io
 import json
 import operator
 import re
+import zlib
 from typing import List, Dict, Any, Optional, Callable, Iterator
 
-from flask import abort
+from flask import abort, current_app
 from flask_sqlalchemy import Pagination
+from sqlalchemy import Column, Date, Float, Integer, Time
+from sqlalchemy.orm import Query
 from flask_login import current_user
 from werkzeug import Response
 
 from db import Slip
-from flask_app.auth import db
 import config
 
 
+# Columns, not shown to users in search results and csv files.
+exclude_list = ['something', 'updated', 'phone_num', 'result']
+# Column formatters for search results and exported files,
+# str() is used for the rest (see Slip.to_json).
+column_formatters = {
+    'ref_num': lambda x: f'{int(x):012d}',
+    'time': operator.methodcaller('strftime', '%H:%M'),
+}
+CSV_CHUNK_SIZE = 5000
+ARROW_CHUNK_SIZE = 50000
+
+
 def page_error_handler(pagination: Pagination) -> Response:
     """Error handler for out of range page_id's."""
     abort(404, f'Page {pagination.page} is out of range.')
@@ -45,7 +60,8 @@ def get_data(
     Returns
     -------
     List[Slip]
-        Returns list of Slip objects.
+        Returns list of Slip objects or column tuples, whatever the pagination
+        query selects.
 
     """
     # pagination = get_from_db_paginate(form, page_id or 1, per_page)
@@ -60,15 +76,46 @@ def get_data(
     return data
 
 
-def prettify_result(input_: List[Slip]) -> List[Dict[str, str]]:
+def display_columns() -> List[Column]:
+    """Returns Slip columns, that are shown in search results and exported files."""
+    return [c for c in Slip.__table__.columns if c.key not in exclude_list]
+
+
+def rows_to_json(rows: List[tuple], columns: List[Column]) -> List[Dict[str, str]]:
+    """
+    Converts rows of selected columns to dicts with stringified values,
+    same as Slip.to_json does for whole Slip objects.
+
+    Parameters
+    ----------
+    rows
+        Column tuples, the output from database query with_entities(*columns).
+    columns
+        Columns, that were selected.
+
+    Returns
+    -------
+    List[Dict[str, str]]
+        List of dictionaries, where both keys and values are strings.
+
+    """
+    keys = [c.key for c in columns]
+    formatters = [column_formatters.get(key, str) for key in keys]
+    return [
+        dict(zip(keys, [f(value) for f, value in zip(formatters, row)]))
+        for row in rows
+    ]
+
+
+def prettify_result(input_: List[tuple]) -> List[Dict[str, str]]:
     """
-    Prettify list of Slips from input to list of Dict[str, str]
-    with leading _id, starting from 1
+    Prettify list of rows from input to list of Dict[str, str]
+    with trailing _id, starting from 1
 
     Parameters
     ----------
     input_
-        List of Slips - the output from database query.
+        List of display_columns() tuples - the output from database query.
 
     Returns
     -------
@@ -76,16 +123,15 @@ def prettify_result(input_: List[Slip]) -> List[Dict[str, str]]:
         List of enumerated dictionaries, where both keys and values are strings.
 
     """
-    exclude_list = ['something', 'updated', 'phone_num', 'result']
-    result = [exclude_keys(el.to_json(), exclude_list)
-              for el in input_]
-    result = [{**el, '_id': str(i)} for i, el in enumerate(result, start=1)]
+    result = rows_to_json(input_, display_columns())
+    for i, el in enumerate(result, start=1):
+        el['_id'] = str(i)
     return result
 
 
 def save_form_to_current_user(form: Dict[str, str]) -> None:
     """
-    Fills last_query fild of User with jsonified form.
+    Saves form as the last query of current user to query store.
     Used to effectively paginate.
 
     Parameters
@@ -96,18 +142,16 @@ def save_form_to_current_user(form: Dict[str, str]) -> None:
     Returns
     -------
     None
-        Only works with DB, nothign is returned.
+        Only works with query store, nothing is returned.
 
     """
-    user = current_user
-    user.last_query = json.dumps(form)
-    db.session.add(user)
-    db.session.commit()
+    current_app.extensions['query_store'].set(current_user.get_id(), form)
 
 
 def get_form_for_current_user() -> Dict[str, str]:
     """
-    Returns form, saved in user DB for current user.
+    Returns form, saved in query store for current user.  Falls back to
+    last_query, saved in user DB by earlier versions.
 
     Returns
     -------
@@ -115,8 +159,10 @@ def get_form_for_current_user() -> Dict[str, str]:
         Dictionary with form from previous successful query.
 
     """
-    last_query = current_user.last_query or '{}'
-    return json.loads(last_query)
+    form = current_app.extensions['query_store'].get(current_user.get_id())
+    if form is None:
+        form = json.loads(current_user.last_query or '{}')
+    return form
 
 
 def format_summ(s: Optional[str]) -> Optional[str]:
@@ -166,7 +212,8 @@ def format_pos_id(s: Optional[str]) -> Optional[str]:
 def get_from_db_paginate(
     form: Dict[str, str],
     page_id: int,
-    per_page: int = None
+    per_page: int = None,
+    columns: List[Column] = None
 ) -> Pagination:
     """
     Queries DB with filters given in a form and returns a Pagination object.
@@ -179,6 +226,9 @@ def get_from_db_paginate(
         Page number.
     per_page
         Items per page
+    columns
+        Columns to select.  If set, pagination items are lightweight column
+        tuples instead of Slip objects.
 
     Returns
     -------
@@ -187,7 +237,31 @@ def get_from_db_paginate(
 
     """
     per_page = per_page or config.PAGE_SIZE
+    q = get_filtered_query(form)
+    if columns:
+        q = q.with_entities(*columns)
+    pagination = q.paginate(page=page_id, per_page=per_page, error_out=False)
+    return pagination
+
+
+def get_filtered_query(form: Dict[str, str]) -> Query:
+    """
+    Builds Slip query with filters given in a form.
+
+    Parameters
+    ----------
+    form
+        WTForms form.data or any other dict to filter with.
+
+    Returns
+    -------
+    Query
+        Filtered query for Slip objects.
+
+    """
     fixture = {
+        # Plain BETWEEN on partition key lets PostgreSQL prune monthly
+        # partitions outside of the range (see db.partitions).
         'start_date': (
             'date',
             operator.methodcaller(
@@ -258,8 +332,7 @@ def get_from_db_paginate(
         if value and key in fixture:
             filter_attr, filter_func = fixture[key]
             q = q.filter(filter_func(getattr(Slip, filter_attr)))
-    pagination = q.paginate(page=page_id, per_page=per_page, error_out=False)
-    return pagination
+    return q
 
 
 def exclude_keys(
@@ -303,19 +376,310 @@ def stream_csv(page_id: int) -> Iterator[bytes]:
 
     """
     form = get_form_for_current_user()
-    pagination = get_from_db_paginate(form, page_id)
     if page_id != 0:
+        pagination = get_from_db_paginate(form, page_id, columns=display_columns())
         data = get_data(pagination, page_id, error_handler=page_error_handler)
         data_page = prettify_result(data)
         yield csv_as_bytes(data_page)
     else:
-        q = pagination.query
-        write_headers = True
-        for row in q.yield_per(1000):
-            data_all = prettify_result([row])
-            data_all[0].pop('_id')
-            yield csv_as_bytes(data_all, write_headers)
-            write_headers = False
+        yield from stream_query_csv(get_filtered_query(form))
+
+
+def query_chunks(
+    query: Query,
+    columns: List[Column],
+    chunk_size: int
+) -> Iterator[List[tuple]]:
+    """
+    Executes query for plain column tuples, bypassing ORM, and yields
+    results chunk by chunk.
+
+    Parameters
+    ----------
+    query
+        Query for Slip objects, filtered as needed.
+    columns
+        Columns to select.
+    chunk_size
+        Number of rows in one chunk.
+
+    Yields
+    ------
+    List[tuple]
+        Next chunk of rows.
+
+    """
+    statement = query.with_entities(*columns).statement. \
+        execution_options(stream_results=True)
+    result = query.session.execute(statement)
+    try:
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        result.close()
+
+
+def stream_query_csv(
+    query: Query,
+    chunk_size: int = CSV_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Streams all rows of Slip query as utf-8-sig encoded csv file, chunk by chunk.
+    Fetches plain column tuples, bypassing ORM, and formats whole chunk at once.
+
+    Parameters
+    ----------
+    query
+        Query for Slip objects, filtered as needed.
+    chunk_size
+        Number of rows to fetch, format and yield at once.
+
+    Yields
+    -------
+    bytes
+        Returns utf-8-sig encoded csv content, first chunk starts with BOM
+        and headers.
+
+    """
+    columns = display_columns()
+    formatters = [column_formatters.get(c.key, str) for c in columns]
+
+    def format_row(row):
+        return [f(value) for f, value in zip(formatters, row)]
+
+    buffer = io.StringIO()
+    w = csv.writer(buffer, delimiter=';')
+    w.writerow([c.key for c in columns])
+    encoding = 'utf-8-sig'
+    for rows in query_chunks(query, columns, chunk_size):
+        w.writerows(map(format_row, rows))
+        yield buffer.getvalue().encode(encoding)
+        # BOM is written only once, at the start of the file.
+        encoding = 'utf-8'
+        buffer.seek(0)
+        buffer.truncate()
+    if encoding == 'utf-8-sig':
+        # Nothing found, but file still has headers.
+        yield buffer.getvalue().encode(encoding)
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compresses stream of bytes on the fly into gzip file.
+
+    Parameters
+    ----------
+    chunks
+        Iterator with content of the file.
+    level
+        Compression level, from 1 (fastest) to 9 (smallest).
+
+    Yields
+    ------
+    bytes
+        Next part of gzip file.
+
+    """
+    # wbits=31 tells zlib to write gzip header and trailer.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only file-like object, that keeps written bytes until drained.
+    Keeps track of the position, so writers can still use tell().
+    """
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        """Returns and forgets everything written since the last drain."""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_query_arrow(
+    query: Query,
+    file_format: str = 'parquet',
+    chunk_size: int = ARROW_CHUNK_SIZE,
+    first_id: int = None
+) -> Iterator[bytes]:
+    """
+    Streams all rows of Slip query as Parquet file or Arrow IPC stream,
+    one record batch (row group for Parquet) per chunk.  Requires pyarrow.
+
+    Parameters
+    ----------
+    query
+        Query for Slip objects, filtered as needed.
+    file_format
+        'parquet' or 'arrow'.
+    chunk_size
+        Number of rows in one record batch.
+    first_id
+        If set, rows are numbered in trailing _id column, starting with
+        first_id, as in csv page exports.
+
+    Yields
+    -------
+    bytes
+        Next part of the file.
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed.
+
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        Date: pa.date32(),
+        Time: pa.time64('us'),
+        Float: pa.float64(),
+        Integer: pa.int64(),
+    }
+    columns = display_columns()
+    types = [arrow_types.get(type(c.type), pa.string()) for c in columns]
+    fields = [(c.key, t) for c, t in zip(columns, types)]
+    if first_id is not None:
+        fields.append(('_id', pa.int64()))
+    schema = pa.schema(fields)
+
+    sink = ChunkSink()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for rows in query_chunks(query, columns, chunk_size):
+        arrays = [pa.array(values, type=t) for values, t in zip(zip(*rows), types)]
+        if first_id is not None:
+            arrays.append(pa.array(range(first_id, first_id + len(rows)), type=pa.int64()))
+            first_id += len(rows)
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def arrow_available() -> bool:
+    """Checks if optional pyarrow package is installed."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+# Export formats with their mimetypes and file extensions.
+export_formats = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+arrow_formats = ('parquet', 'arrow')
+
+
+def stream_query_file(query: Query, file_format: str = 'csv') -> Iterator[bytes]:
+    """
+    Streams all rows of Slip query as a file in one of export_formats.
+
+    Parameters
+    ----------
+    query
+        Query for Slip objects, filtered as needed.
+    file_format
+        Key from export_formats.
+
+    Returns
+    -------
+    Iterator[bytes]
+        Content of the file, chunk by chunk.
+
+    """
+    if file_format == 'csv':
+        return stream_query_csv(query)
+    if file_format == 'csv.gz':
+        return gzip_stream(stream_query_csv(query))
+    return stream_query_arrow(query, file_format)
+
+
+def check_page(page_id: int) -> None:
+    """
+    Aborts with 404, if page_id is after the last page of current user's
+    query.  Call it before streaming the page: an error inside a stream
+    comes after 200 status is sent.
+
+    Parameters
+    ----------
+    page_id
+        Number of desired page.  0 means all results and is always valid.
+
+    Returns
+    -------
+    None
+
+    """
+    if not page_id:
+        return
+    query = get_filtered_query(get_form_for_current_user()).with_entities(Slip.date)
+    offset = (page_id - 1) * config.PAGE_SIZE
+    # As in get_data, pages after the last one are errors, unless nothing is found.
+    if offset and query.offset(offset).first() is None and query.first() is not None:
+        abort(404, f'Page {page_id} is out of range.')
+
+
+def stream_file(page_id: int, file_format: str = 'csv') -> Iterator[bytes]:
+    """
+    Streams query result as a file in one of export_formats.  Check
+    page_id with check_page first.
+
+    Parameters
+    ----------
+    page_id
+        Number of desired page.  Can be 0 to get all results.
+    file_format
+        Key from export_formats.
+
+    Yields
+    -------
+    bytes
+        Next part of the file.
+
+    """
+    if file_format == 'csv':
+        yield from stream_csv(page_id)
+    elif file_format == 'csv.gz':
+        yield from gzip_stream(stream_csv(page_id))
+    else:
+        form = get_form_for_current_user()
+        query = get_filtered_query(form)
+        if not page_id:
+            yield from stream_query_arrow(query, file_format)
+            return
+        per_page = config.PAGE_SIZE
+        query = query.limit(per_page).offset((page_id - 1) * per_page)
+        # Rows are numbered within the page, as in csv page exports.
+        yield from stream_query_arrow(query, file_format, first_id=1)
 
 
 def csv_as_bytes(result: List[dict], write_headers: bool = True) -> bytes:
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import os.path as pth
+import tempfile
+from time import time
+from typing import Dict, Optional
+
+from flask import Flask, session
+
+from flask_app.cache import TTLCache
+
+
+class CookieQueryStore:
+    """
+    Keeps last query in Flask session, i.e. in the signed cookie of the user.
+    Needs no server side state, so works with any number of workers.
+    """
+    key = 'last_query'
+
+    def get(self, user_id: str) -> Optional[Dict[str, str]]:
+        stored = session.get(self.key)
+        if not stored or stored.get('user') != user_id:
+            return None
+        return stored['form']
+
+    def set(self, user_id: str, form: Dict[str, str]) -> None:
+        # Unchanged form doesn't mark session modified, so cookie isn't resent.
+        if self.get(user_id) != form:
+            session[self.key] = {'user': user_id, 'form': form}
+
+
+class MemoryQueryStore:
+    """
+    Keeps last queries in process memory, not shared between workers.
+
+    Parameters
+    ----------
+    maxsize
+        Maximum number of users.
+    ttl
+        Time to live of a query in seconds.
+
+    """
+    def __init__(self, maxsize: int = 10000, ttl: float = 24 * 60 * 60):
+        self.cache = TTLCache(maxsize, ttl)
+
+    def get(self, user_id: str) -> Optional[Dict[str, str]]:
+        return self.cache.get(user_id)
+
+    def set(self, user_id: str, form: Dict[str, str]) -> None:
+        self.cache.set(user_id, dict(form))
+
+
+class FileQueryStore:
+    """
+    Keeps last queries in a local directory, one JSON file per user,
+    shared by all workers on the host.  Files are replaced atomically.
+
+    Parameters
+    ----------
+    path
+        Directory for query files.
+    ttl
+        Files older than ttl seconds are removed by prune.
+
+    """
+    def __init__(self, path: str, ttl: float = 24 * 60 * 60):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, user_id: str) -> str:
+        name = hashlib.sha256(str(user_id).encode('utf-8')).hexdigest()[:32]
+        return pth.join(self.path, f'{name}.json')
+
+    def get(self, user_id: str) -> Optional[Dict[str, str]]:
+        try:
+            with open(self.file_path(user_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, user_id: str, form: Dict[str, str]) -> None:
+        if self.get(user_id) == form:
+            return
+        path = self.file_path(user_id)
+        with tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', dir=self.path, suffix='.tmp', delete=False
+        ) as f:
+            json.dump(form, f)
+        os.replace(f.name, path)
+
+    def prune(self) -> int:
+        """Removes expired query files, returns their number."""
+        counter = 0
+        for entry in os.scandir(self.path):
+            if time() - entry.stat().st_mtime > self.ttl:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                counter += 1
+        return counter
+
+
+def init_app(app: Flask) -> None:
+    """
+    Creates query store, selected with QUERY_STORE setting:
+    'cookie', 'memory' or 'file'.
+    """
+    kind = app.config['QUERY_STORE']
+    if kind == 'cookie':
+        store = CookieQueryStore()
+    elif kind == 'memory':
+        store = MemoryQueryStore(ttl=app.config['QUERY_STORE_TTL'])
+    elif kind == 'file':
+        store = FileQueryStore(app.config['QUERY_STORE_DIR'], app.config['QUERY_STORE_TTL'])
+    else:
+        raise ValueError(f'Unknown QUERY_STORE {kind}.')
+    app.extensions['query_store'] = store
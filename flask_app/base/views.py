@@ -1,11 +1,12 @@
 from flask import Blueprint, request, render_template, flash, redirect, url_for
-from flask import Response, session, abort, stream_with_context
+from flask import Response, session, abort, stream_with_context, jsonify, send_file
 from flask_login import login_required
 from loguru import logger
 from werkzeug.datastructures import MultiDict
 
 from .forms import SlipSearch
 from . import functions
+from .exports import exports
 
 
 views = Blueprint('views', __name__, template_folder='templates')
@@ -53,7 +54,9 @@ def output_fn():
         search_form = functions.get_form_for_current_user()
 
     logger.debug(f'Searching with:\n{search_form}')
-    pagination = functions.get_from_db_paginate(search_form, page_id)
+    pagination = functions.get_from_db_paginate(
+        search_form, page_id, columns=functions.display_columns()
+    )
     data = functions.get_data(pagination, page_id, error_handler=functions.page_error_handler)
 
     if not data:
@@ -76,15 +79,71 @@ def output_fn():
 @login_required
 def download_file():
     """
-    Streams csv vile for page_id or all pages if page_id is 0.
+    Streams file for page_id or all pages if page_id is 0.
+    File format is set with format argument, csv by default.
     """
     page_id = request.args.get('page', 0, int)
     if page_id < 0:
         abort(404, f'Specify correct page number.')
-    file_name = f'query_result_{("page_" + str(page_id)) if page_id else "all"}.csv'
+    file_format = request.args.get('format', 'csv')
+    if file_format not in functions.export_formats:
+        abort(404, f'Unknown file format {file_format}.')
+    if file_format in functions.arrow_formats and not functions.arrow_available():
+        abort(501, f'Install pyarrow to export {file_format} files.')
+    functions.check_page(page_id)
+    mimetype, extension = functions.export_formats[file_format]
+    file_name = f'query_result_{("page_" + str(page_id)) if page_id else "all"}.{extension}'
 
     return Response(
-        stream_with_context(functions.stream_csv(page_id)),
-        mimetype='text/csv',
+        stream_with_context(functions.stream_file(page_id, file_format)),
+        mimetype=mimetype,
         headers={'Content-Disposition': f'attachment; filename={file_name}'}
     )
+
+
+@views.route('/exports', methods=['POST'])
+@login_required
+def create_export():
+    """
+    Starts background export of all results for the last query of current
+    user and returns job description to poll.
+    """
+    file_format = request.args.get('format', 'csv')
+    if file_format not in functions.export_formats:
+        abort(404, f'Unknown file format {file_format}.')
+    if file_format in functions.arrow_formats and not functions.arrow_available():
+        abort(501, f'Install pyarrow to export {file_format} files.')
+    form = functions.get_form_for_current_user()
+    job_id = exports.submit(form, file_format)
+    return jsonify(exports.describe(job_id)), 202
+
+
+@views.route('/exports/<job_id>', methods=['GET'])
+@login_required
+def export_status(job_id: str):
+    """
+    Returns export job description with it's status.
+    """
+    job = exports.describe(job_id)
+    if not job:
+        abort(404, f'No export job {job_id}.')
+    return jsonify(job)
+
+
+@views.route('/exports/<job_id>/file', methods=['GET'])
+@login_required
+def export_file(job_id: str):
+    """
+    Sends finished export file, supports Range requests to resume downloads.
+    """
+    job = exports.describe(job_id)
+    if not job or job['status'] != 'done':
+        abort(404, f'Export {job_id} is not ready.')
+    mimetype, extension = functions.export_formats[job['format']]
+    return send_file(
+        exports.path(job_id),
+        mimetype=mimetype,
+        as_attachment=True,
+        attachment_filename=f'query_result_all.{extension}',
+        conditional=True
+    )
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Hashable, Union
+
+from loguru import logger
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache with time to live for every entry.
+    When maxsize is reached, least recently used entry is dropped.
+
+    Parameters
+    ----------
+    maxsize
+        Maximum number of entries.
+    ttl
+        Time to live of an entry in seconds.
+
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns value for key or default if key is missing or expired.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < monotonic():
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float = None) -> None:
+        """
+        Stores value for key, dropping least recently used entries if needed.
+        """
+        expires = monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires, value)
+            self._added(key, value)
+            while self._is_full():
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes key from cache and returns it's value."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns counters for monitoring."""
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+    def _is_full(self) -> bool:
+        """Checks if least recently used entry should be dropped."""
+        return len(self._data) > self.maxsize
+
+    def _added(self, key: Hashable, value: Any) -> None:
+        """Hook for subclasses, called under lock when entry is added."""
+
+    def _remove(self, key: Hashable) -> Any:
+        """Removes entry under lock, returns it's value."""
+        return self._data.pop(key)[1]
+
+
+class SizedTTLCache(TTLCache):
+    """
+    TTLCache for bytes values, bounded by total size of values.
+    Values larger than maxbytes are not stored.
+
+    Parameters
+    ----------
+    maxbytes
+        Maximum total size of values in bytes.
+    ttl
+        Time to live of an entry in seconds.
+    maxsize
+        Maximum number of entries.
+
+    """
+    def __init__(self, maxbytes: int, ttl: float = 60.0, maxsize: int = 100000):
+        super().__init__(maxsize, ttl)
+        self.maxbytes = maxbytes
+        self.currbytes = 0
+
+    def set(self, key: Hashable, value: bytes, ttl: float = None) -> None:
+        if len(value) > self.maxbytes:
+            return
+        super().set(key, value, ttl)
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), 'bytes': self.currbytes}
+
+    def _is_full(self) -> bool:
+        return super()._is_full() or self.currbytes > self.maxbytes
+
+    def _added(self, key: Hashable, value: bytes) -> None:
+        self.currbytes += len(value)
+
+    def _remove(self, key: Hashable) -> bytes:
+        value = super()._remove(key)
+        self.currbytes -= len(value)
+        return value
+
+
+class RedisCache:
+    """
+    Cache for bytes values, kept on Redis server and shared by all workers.
+    It's best effort: server errors are logged and treated as misses.
+
+    Parameters
+    ----------
+    client
+        redis.Redis or any client with get(name) and set(name, value, ex).
+    ttl
+        Time to live of an entry in seconds.
+    prefix
+        Prefix for all keys.
+
+    """
+    def __init__(self, client, ttl: float = 60.0, prefix: str = 'slips:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_url(cls, url: str, ttl: float = 60.0) -> 'RedisCache':
+        """Connects to Redis server, requires optional redis package."""
+        import redis
+        return cls(redis.Redis.from_url(url), ttl)
+
+    def get(self, key: str, default: Any = None) -> Union[bytes, Any]:
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f'Cache server error: {e!r}')
+            value = None
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+        except Exception as e:
+            logger.warning(f'Cache server error: {e!r}')
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def create_result_cache(config: Dict[str, Any]) -> Union[SizedTTLCache, RedisCache]:
+    """
+    Creates cache for serialized API responses from app config:
+    Redis if API_CACHE_URL is set, in-process LRU otherwise.
+    """
+    if config['API_CACHE_URL']:
+        return RedisCache.from_url(config['API_CACHE_URL'], config['API_CACHE_TTL'])
+    return SizedTTLCache(config['API_CACHE_MAXBYTES'], config['API_CACHE_TTL'])
@@ -0,0 +1,23 @@
+import flask_sqlalchemy
+
+from db import engines
+
+
+class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
+    """
+    Flask-SQLAlchemy, taking engines from db.engines registry, so the slip
+    DB, the auth DB and db.Session share one engine and pool per database.
+    Flask-SQLAlchemy driver hacks still apply (MySQL charset, SQLite path
+    relative to app.root_path and so on), but the pool class of SQLite is
+    chosen by the registry.
+    """
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith('sqlite'):
+            # Registry uses StaticPool in memory and QueuePool for files
+            # instead of NullPool, set by Flask-SQLAlchemy without pool_size.
+            options.pop('poolclass', None)
+            options['pragmas'] = engines.sqlite_pragmas(app.config)
+
+    def create_engine(self, sa_url, engine_opts):
+        return engines.get_engine(str(sa_url), **engine_opts)
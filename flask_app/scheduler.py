@@ -0,0 +1,218 @@
+import datetime as dt
+import json
+import os
+import tempfile
+from threading import Thread
+from time import sleep, time
+from typing import Any, Callable, Dict, IO, List, Optional, Tuple
+
+from flask import Flask, current_app
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows.
+    fcntl = None
+    import msvcrt
+
+
+class Scheduler:
+    """
+    Runs periodic maintenance jobs in a background thread of one process.
+    Every process of the app starts the thread, but only the one, holding
+    exclusive lock on SCHEDULER_LOCK_PATH, runs jobs.  Lock is released by
+    OS when it's holder dies, then another process takes over.
+
+    Times and results of the last runs are kept in SCHEDULER_STATE_PATH,
+    so jobs keep their schedule across restarts and leader changes.
+
+    Parameters
+    ----------
+    app
+        Flask application, can be set later with init_app.
+
+    """
+    def __init__(self, app: Flask = None):
+        self.jobs: Dict[str, Tuple[Callable[[], Any], str]] = {}
+        self.lock_file: Optional[IO] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions['scheduler'] = self
+
+    def job(self, name: str, interval_key: str) -> Callable:
+        """
+        Registers decorated function as a job, running every
+        app.config[interval_key] seconds.  Zero interval disables the job.
+        """
+        def decorator(func: Callable[[], Any]) -> Callable[[], Any]:
+            self.jobs[name] = (func, interval_key)
+            return func
+        return decorator
+
+    def acquire(self, lock_path: str) -> bool:
+        """
+        Tries to become the leader, returns True if this process holds the lock.
+        """
+        if self.lock_file:
+            return True
+        lock_file = open(lock_path, 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        logger.info(f'Process {os.getpid()} runs scheduled jobs.')
+        return True
+
+    def release(self) -> None:
+        """Closes lock file, releasing the lock."""
+        if self.lock_file:
+            self.lock_file.close()
+            self.lock_file = None
+
+    @staticmethod
+    def load_state() -> Dict[str, Dict[str, Any]]:
+        """Returns last runs of all jobs."""
+        try:
+            with open(current_app.config['SCHEDULER_STATE_PATH'], encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def save_state(state: Dict[str, Dict[str, Any]]) -> None:
+        path = current_app.config['SCHEDULER_STATE_PATH']
+        with tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', dir=os.path.dirname(os.path.abspath(path)),
+            suffix='.tmp', delete=False
+        ) as f:
+            json.dump(state, f, indent=2, default=str)
+        os.replace(f.name, path)
+
+    @staticmethod
+    def remove_sessions() -> None:
+        """
+        Closes sessions of the app DBs.  Scheduler thread keeps one app
+        context for the life of the process, so a job, failed during flush,
+        would leave the session unusable for all later jobs otherwise.
+        """
+        from flask_app import db_slip
+        from .auth import db
+        db.session.remove()
+        db_slip.session.remove()
+
+    def run_job(self, name: str) -> Dict[str, Any]:
+        """
+        Runs job and appends the run to it's history.
+
+        Parameters
+        ----------
+        name
+            Name of registered job.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Run description: start, duration, status and result or error.
+
+        """
+        func, _ = self.jobs[name]
+        start = time()
+        run: Dict[str, Any] = {'started': start}
+        try:
+            run['result'] = func()
+            run['status'] = 'done'
+        except Exception as e:
+            logger.exception(f'Job {name} failed.')
+            run['status'] = 'failed'
+            run['error'] = repr(e)
+        finally:
+            self.remove_sessions()
+        run['duration'] = round(time() - start, 3)
+        logger.info(f'Job {name} is {run["status"]} in {run["duration"]} seconds.')
+
+        state = self.load_state()
+        history = state.get(name, {}).get('history', [])
+        history = ([run] + history)[:current_app.config['SCHEDULER_HISTORY']]
+        state[name] = {'last_started': start, 'history': history}
+        self.save_state(state)
+        return run
+
+    def run_pending(self, now: float = None) -> List[str]:
+        """
+        Runs all jobs, that are due.
+
+        Returns
+        -------
+        List[str]
+            Names of jobs, that were run.
+
+        """
+        now = time() if now is None else now
+        state = self.load_state()
+        ran = []
+        for name, (_, interval_key) in self.jobs.items():
+            interval = current_app.config[interval_key]
+            last_started = state.get(name, {}).get('last_started', 0)
+            if interval and now - last_started >= interval:
+                self.run_job(name)
+                ran.append(name)
+        return ran
+
+    def run(self, app: Flask) -> None:
+        """Runs due jobs forever, if leader.  Runs in a background thread."""
+        with app.app_context():
+            while True:
+                try:
+                    if self.acquire(app.config['SCHEDULER_LOCK_PATH']):
+                        self.run_pending()
+                except Exception:
+                    logger.exception('Scheduler failed.')
+                sleep(app.config['SCHEDULER_TICK'])
+
+    def start(self, app: Flask) -> Thread:
+        """Starts background scheduler thread for the app."""
+        thread = Thread(target=self.run, args=(app,), name='scheduler', daemon=True)
+        thread.start()
+        return thread
+
+
+scheduler = Scheduler()
+
+
+@scheduler.job('delete_unverified_users', 'SCHEDULER_CLEANUP_INTERVAL')
+def delete_unverified_users_job():
+    from .admin.utils import delete_unverified_users
+    return delete_unverified_users()
+
+
+@scheduler.job('refresh_stats', 'SCHEDULER_STATS_INTERVAL')
+def refresh_stats_job() -> str:
+    """
+    Recounts daily totals for recent days from slips, fixing totals
+    for slips, changed bypassing the app.
+    """
+    from db.stats import refresh_stats
+    from flask_app import db_slip
+    end_date = dt.date.today()
+    start_date = end_date - dt.timedelta(days=current_app.config['SCHEDULER_STATS_DAYS'])
+    refresh_stats(db_slip.session, start_date, end_date)
+    db_slip.session.commit()
+    return f'{start_date} - {end_date}'
+
+
+@scheduler.job('prune_files', 'SCHEDULER_PRUNE_INTERVAL')
+def prune_files_job() -> Dict[str, int]:
+    """Removes expired export files and saved queries."""
+    from .base.exports import exports
+    store = current_app.extensions['query_store']
+    return {
+        'exports': exports.prune(),
+        'queries': store.prune() if hasattr(store, 'prune') else 0,
+    }
@@ -0,0 +1,118 @@
+"""partition slips by month
+
+Unique constraints of a partitioned table must include the partition key,
+so the primary key becomes (file_link, date) and date becomes NOT NULL:
+the migration fails, if some slips have no date.  Uniqueness of file_link
+alone is kept by slip_file_links table, maintained by a trigger on slips,
+so inserting a known file_link fails as before.
+
+Rows, whose monthly partition wasn't created by ensure_partitions, go to
+slips_default.
+
+Revision ID: 5e0c8a1d2b7f
+Revises: f6824e1b3581
+Create Date: 2026-10-19 10:12:31.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from db.partitions import month_bounds, partition_name
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0c8a1d2b7f'
+down_revision = 'f6824e1b3581'
+branch_labels = None
+depends_on = None
+
+indexed_columns = (
+    'date',
+    'pos_id',
+    'merchant_num',
+    'card_number',
+    'summ',
+    'auth_code',
+    'ref_num',
+    'object_code',
+)
+
+file_link_function = '''
+CREATE FUNCTION slips_file_link_unique() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM slip_file_links WHERE file_link = OLD.file_link;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        INSERT INTO slip_file_links (file_link) VALUES (NEW.file_link);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+'''
+
+
+def upgrade():
+    # Declarative partitioning is PostgreSQL only, other dialects keep
+    # single slips table.
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    undated = bind.execute(
+        'SELECT count(*) FROM slips WHERE date IS NULL'
+    ).scalar()
+    if undated:
+        raise RuntimeError(f'{undated} slips have no date, set it before partitioning.')
+    op.rename_table('slips', 'slips_unpartitioned')
+    # Free index names for the new table.
+    for column in indexed_columns + ('file_link',):
+        op.drop_index(f'ix_slips_{column}', table_name='slips_unpartitioned')
+    op.execute(
+        'CREATE TABLE slips (LIKE slips_unpartitioned INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (date)'
+    )
+    # Unique constraints on partitioned table must include partition key.
+    op.create_primary_key('pk_slips', 'slips', ['file_link', 'date'])
+    for column in indexed_columns:
+        op.create_index(f'ix_slips_{column}', 'slips', [column])
+    # Keeps file_link unique across partitions.  Row movement between
+    # partitions fires DELETE and INSERT triggers, not UPDATE.
+    op.create_table(
+        'slip_file_links',
+        sa.Column('file_link', sa.String(), primary_key=True)
+    )
+    op.execute(file_link_function)
+    op.execute(
+        'CREATE TRIGGER slips_file_link_unique '
+        'AFTER INSERT OR DELETE OR UPDATE OF file_link ON slips '
+        'FOR EACH ROW EXECUTE PROCEDURE slips_file_link_unique()'
+    )
+
+    min_date, max_date = bind.execute(
+        'SELECT min(date), max(date) FROM slips_unpartitioned'
+    ).first()
+    if min_date:
+        for lower, upper in month_bounds(min_date, max_date):
+            op.execute(
+                f'CREATE TABLE {partition_name(lower)} PARTITION OF slips '
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+    op.execute('CREATE TABLE slips_default PARTITION OF slips DEFAULT')
+    op.execute('INSERT INTO slips SELECT * FROM slips_unpartitioned')
+    op.drop_table('slips_unpartitioned')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute('CREATE TABLE slips_unpartitioned (LIKE slips INCLUDING DEFAULTS)')
+    op.execute('INSERT INTO slips_unpartitioned SELECT * FROM slips')
+    op.drop_table('slips')
+    op.drop_table('slip_file_links')
+    op.execute('DROP FUNCTION slips_file_link_unique()')
+    op.rename_table('slips_unpartitioned', 'slips')
+    op.create_primary_key('slips_pkey', 'slips', ['file_link'])
+    for column in indexed_columns:
+        op.create_index(f'ix_slips_{column}', 'slips', [column])
+    op.create_index('ix_slips_file_link', 'slips', ['file_link'], unique=True)
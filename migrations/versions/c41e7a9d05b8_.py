@@ -0,0 +1,42 @@
+"""daily slip totals
+
+Revision ID: c41e7a9d05b8
+Revises: 7b2d4f9c1e03
+Create Date: 2026-10-19 15:27:44.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7a9d05b8'
+down_revision = '7b2d4f9c1e03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'slip_stats',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('object_code', sa.String(), nullable=False),
+        sa.Column('pos_id', sa.String(), nullable=False),
+        sa.Column('operation_type', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('summ', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('date', 'object_code', 'pos_id', 'operation_type')
+    )
+    op.execute(
+        'INSERT INTO slip_stats '
+        '(date, object_code, pos_id, operation_type, count, summ) '
+        "SELECT date, coalesce(object_code, ''), coalesce(pos_id, ''), "
+        "coalesce(operation_type, ''), count(*), coalesce(sum(summ), 0) "
+        'FROM slips WHERE date IS NOT NULL '
+        "GROUP BY date, coalesce(object_code, ''), coalesce(pos_id, ''), "
+        "coalesce(operation_type, '')"
+    )
+
+
+def downgrade():
+    op.drop_table('slip_stats')
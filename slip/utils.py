@@ -10,6 +10,8 @@ from loguru import logger
 import sqlalchemy.sql.functions as func
 
 from db import Slip, try_query, check_exist, SessionCM
+from db.partitions import ensure_partitions, bump_versions
+from db.stats import add_stats
 
 
 check_exist_link = partial(check_exist, Slip, 'file_link')
@@ -102,8 +104,11 @@ def insert_db(dict_list: List[dict]):
     """
     start = time()
     with SessionCM as session:
+        ensure_partitions(session.connection(), (d.get('date') for d in dict_list))
         slips = [Slip(**d) for d in dict_list]
         operation = session.bulk_save_objects(slips)
+        bump_versions(session, (d.get('date') for d in dict_list))
+        add_stats(session, dict_list)
         try_query(session.commit, logger.warning)
     logger.debug(f'added in {time() - start} seconds.')
 
@@ -12,6 +12,23 @@ from flask_app.auth import db, models
 from .slip_obj import SlipFactory
 
 
+def pytest_addoption(parser):
+    parser.addoption('--runslow', action='store_true', help='run slow tests')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: slow test, run with --runslow')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--runslow'):
+        return
+    skip_slow = pytest.mark.skip(reason='needs --runslow')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
+
+
 @pytest.fixture(scope='session')
 def test_client():
     flask_app = create_app()
@@ -27,6 +44,7 @@ def test_client():
 def init_database(test_client):
     db_slip.create_all()
     db_slip.session.add_all([SlipFactory.build() for _ in range(10000)])
+    db_slip.session.commit()
     yield db_slip
     db_slip.drop_all()
 
@@ -34,6 +52,8 @@ def init_database(test_client):
 @pytest.fixture(scope='module', autouse=True)
 def init_database_auth(test_client):
     db.create_all()
+    # Users are recreated with the same ids.
+    models.user_cache.clear()
     user = models.User(
         username='test_user',
         email='test_user@test.test',
@@ -1,4 +1,6 @@
+import datetime as dt
 import os
+from time import perf_counter
 from typing import Dict, Union
 
 import pytest
@@ -7,8 +9,10 @@ test_config_path = os.path.join(os.path.dirname(__file__), 'test_config.py')
 os.environ['FLASK_APPLICATION_SETTINGS'] = test_config_path
 os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
 
-from flask_app.auth.models import User
+from flask_app.auth.models import User, user_cache
 from flask_app.auth import db
+from flask_app.admin.forms import UserForm
+from flask_app.admin.utils import delete_user, delete_unverified_users, make_forms
 
 admin = {
     'username': 'admin',
@@ -282,5 +286,144 @@ class TestDeletePostNoId(TestAdminPage):
 
 
 class TestMakeForms:
-    def test_make_forms(self):
-        pass
+    @pytest.fixture
+    def app(self, test_client):
+        app = test_client.application
+        page_size = app.config['ADMIN_PAGE_SIZE']
+        app.config['ADMIN_PAGE_SIZE'] = 2
+        with app.test_request_context():
+            yield app
+        app.config['ADMIN_PAGE_SIZE'] = page_size
+
+    def test_pages(self, app):
+        user_ids = [user.id for user in User.query.order_by(User.id)]
+        forms, new_form, pagination = make_forms(None, 2)
+        assert [form.user_id.data for form in forms] == user_ids[2:4]
+        assert pagination.total == len(user_ids)
+        assert new_form.user_id.data == user_ids[-1] + 1
+
+    def test_out_of_range_page(self, app):
+        forms, _, pagination = make_forms(None, 100)
+        assert forms == []
+        assert pagination.page == 100
+
+    def test_search(self, app):
+        forms, _, pagination = make_forms(None, 1, admin['email'].upper())
+        assert [form.username.data for form in forms] == [admin['username']]
+        assert pagination.pages == 1
+
+    @pytest.mark.parametrize('search', ['%', '_', '\\'])
+    def test_search_wildcards(self, app, search):
+        forms, _, pagination = make_forms(None, 1, search)
+        # Wildcards match only themselves.
+        expected = [
+            user.id for user in User.query.order_by(User.id)
+            if search in user.username or search in user.email
+        ]
+        assert pagination.total == len(expected)
+        assert [form.user_id.data for form in forms] == expected[:len(forms)]
+
+    def test_changed_form_on_page(self, app):
+        user = User.query.filter_by(username=admin['username']).first()
+        changed = UserForm(None, data={'user_id': user.id, 'username': user.username, 'email': 'changed@admin.ad'})
+        forms, _, _ = make_forms(changed, 1, admin['username'])
+        assert forms[0].email.data == 'changed@admin.ad'
+
+    def test_search_page(self, test_client, login):
+        login(admin)
+        data = test_client.get('/admin/', query_string={'q': user2['username']}).data.decode('utf-8')
+        assert user2['email'] in data
+        assert user1['email'] not in data
+        # One user and new user form.
+        assert data.count('no-gutters') == 2
+        test_client.get('/logout')
+
+
+class TestUserCache:
+    def test_cached_load(self, test_client):
+        user_cache.clear()
+        user_id = User.query.filter_by(username=user1['username']).first().id
+        hits = user_cache.hits
+        assert user_cache.load(user_id).username == user1['username']
+        cached = user_cache.load(user_id)
+        assert user_cache.hits == hits + 1
+        assert cached.username == user1['username']
+        assert cached.check_password(user1['password_hash'])
+
+    def test_invalidate_on_change(self, test_client):
+        user = User.query.filter_by(username=user1['username']).first()
+        user_cache.load(user.id)
+        user.set_password('654321')
+        db.session.commit()
+        assert user_cache.load(user.id).check_password('654321')
+        user.set_password(user1['password_hash'])
+        db.session.commit()
+
+    def test_invalidate_after_commit(self, test_client):
+        user = User.query.filter_by(username=user1['username']).first()
+        user_cache.load(user.id)
+        user.set_password('654321')
+        db.session.flush()
+        # Not committed change is invisible to other sessions, so the record stays.
+        assert user_cache.get(user.id) is not None
+        db.session.rollback()
+        assert user_cache.get(user.id) is not None
+        assert 'changed_users' not in db.session.info
+        user.set_password('654321')
+        db.session.commit()
+        assert user_cache.get(user.id) is None
+        user.set_password(user1['password_hash'])
+        db.session.commit()
+
+    def test_invalidate_on_delete(self, test_client):
+        user = User.query.filter_by(username=user1['username']).first()
+        user_id = user.id
+        user_cache.load(user_id)
+        delete_user(user_id)
+        assert user_cache.load(user_id) is None
+
+
+def seed_bots(count: int) -> None:
+    stale = dt.datetime.now() - dt.timedelta(days=6)
+    rows = [
+        {
+            'username': f'bot{i}',
+            'email': f'bot{i}@bot.bot',
+            'password_hash': 'hash',
+            'is_verified': i % 10 == 0,
+            'date_created': stale if i % 10 != 1 else dt.datetime.now(),
+        }
+        for i in range(count)
+    ]
+    db.session.bulk_insert_mappings(User, rows)
+    db.session.commit()
+
+
+def delete_bots() -> None:
+    User.query.filter(User.username.like('bot%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def test_delete_unverified_users(test_client):
+    count = 1000
+    seed_bots(count)
+    users_before = User.query.count()
+
+    deleted = delete_unverified_users()
+    assert deleted == count * 8 // 10
+    assert User.query.count() == users_before - deleted
+    assert User.query.filter(User.username.like('bot%')).count() == count * 2 // 10
+    assert delete_unverified_users() == 0
+    delete_bots()
+
+
+@pytest.mark.slow
+def test_delete_unverified_users_timing(test_client):
+    count = 100000
+    seed_bots(count)
+    start = perf_counter()
+    deleted = delete_unverified_users()
+    seconds = perf_counter() - start
+    delete_bots()
+    assert deleted == count * 8 // 10
+    assert seconds < 10
@@ -6,6 +6,7 @@ from typing import Any
 import pytest
 
 import tests.slip_obj as slip_obj
+from flask_app.cache import SizedTTLCache, RedisCache
 
 
 test_config_path = os.path.join(os.path.dirname(__file__), 'test_config.py')
@@ -168,6 +169,7 @@ def test_post_slips_some_of_many(post_slips):
     data = response.data
     assert response.status_code == 201, data
     assert b'Added 2 slips out of 3' in data, data
+    assert b'skipped 1' in data, data
 
 
 def test_get_slip(get_slip, post_slips):
@@ -287,3 +289,428 @@ def test_delete_bad_auth(delete_slip):
         headers={'Authorization': f'Basic {base64.b64encode(b"user:fdfsa")}'}
     )
     assert response.status_code == 401, response.data
+
+
+def test_insert_slips_chunks(test_client, init_database):
+    from flask_app.api.utils import insert_slips
+    from db import Slip
+
+    try:
+        slips = [*slip_obj.slips, slip_obj.slip]
+        assert insert_slips(slips, chunk_size=2) == (3, 1)
+        assert insert_slips([slip_obj.slip, slip_obj.slip2], chunk_size=1) == (0, 2)
+    finally:
+        links = [slip['file_link'] for slip in slip_obj.slips]
+        Slip.query.filter(Slip.file_link.in_(links)).delete(synchronize_session=False)
+        init_database.session.commit()
+
+
+@pytest.fixture(scope='function')
+def post_ndjson(test_client, init_database):
+    def poster(lines, headers: dict = None, content_type: str = 'application/x-ndjson'):
+        headers = headers or {}
+        data = '\n'.join(
+            line if isinstance(line, str) else json.dumps(line) for line in lines
+        )
+        return test_client.post(
+            f'{API_URL}/ndjson',
+            data=data.encode('utf-8'),
+            content_type=content_type,
+            headers=headers
+        )
+    yield poster
+    for slip in slip_obj.slips:
+        url = f'{API_URL}/{slip["date"]}/{slip["ref_num"]}'
+        test_client.delete(url, headers=HEADERS)
+
+
+def test_post_ndjson(post_ndjson):
+    lines = [
+        slip_obj.slip,
+        '',
+        '{not json',
+        {**slip_obj.slip2, 'pos_id': 'abc'},
+        {**slip_obj.slip2, 'time': '99:99'},
+        slip_obj.slip2,
+        slip_obj.slip,
+    ]
+    response = post_ndjson(lines, headers=HEADERS)
+    assert response.status_code == 201, response.data
+    result = json.loads(response.data)
+    assert result['added'] == 2, result
+    assert result['skipped'] == 1, result
+    assert result['invalid'] == 3, result
+    assert [error['line'] for error in result['errors']] == [3, 4, 5], result
+
+
+def test_ndjson_schema(test_client):
+    import jsonschema
+    import yaml
+
+    with open(test_client.application.config['SCHEMA_PATH'], encoding='utf-8') as f:
+        spec = yaml.safe_load(f)
+    operation = spec['paths']['/slips/ndjson']['post']
+    assert operation['operationId'] == 'flask_app.api.ingest.add_slips_ndjson'
+    assert 'application/x-ndjson' in operation['requestBody']['content']
+    jsonschema.validate(
+        {'added': 1, 'skipped': 0, 'invalid': 1, 'errors': [{'line': 2, 'error': 'x'}]},
+        spec['components']['schemas']['IngestModel']
+    )
+    # Documented only, the body is streamed by the blueprint, not connexion.
+    adapter = test_client.application.url_map.bind('127.0.0.1')
+    assert adapter.match('/api/slips/ndjson', 'POST')[0] == 'ingest.add_slips_ndjson'
+
+
+def test_post_ndjson_not_unique(post_ndjson):
+    post_ndjson([slip_obj.slip], headers=HEADERS)
+    response = post_ndjson([slip_obj.slip], headers=HEADERS)
+    assert response.status_code == 409, response.data
+
+
+def test_post_ndjson_all_invalid(post_ndjson):
+    response = post_ndjson(['[]'], headers=HEADERS)
+    assert response.status_code == 400, response.data
+
+
+def test_post_ndjson_no_auth(post_ndjson):
+    response = post_ndjson([slip_obj.slip])
+    assert response.status_code == 401, response.data
+
+
+def test_post_ndjson_bad_auth(post_ndjson):
+    headers = {'Authorization': f'Basic {base64.b64encode(b"user:fdfsa").decode("utf-8")}'}
+    response = post_ndjson([slip_obj.slip], headers=headers)
+    assert response.status_code == 401, response.data
+
+
+def test_post_ndjson_token_auth(test_client, post_ndjson):
+    headers = {'Authorization': f'Bearer {get_token(test_client)}'}
+    response = post_ndjson([slip_obj.slip], headers=headers)
+    assert response.status_code == 201, response.data
+
+
+def test_post_ndjson_bad_token(post_ndjson):
+    response = post_ndjson([slip_obj.slip], headers={'Authorization': 'Bearer not.a.token'})
+    assert response.status_code == 401, response.data
+
+
+def test_post_ndjson_bad_content_type(post_ndjson):
+    response = post_ndjson([slip_obj.slip], headers=HEADERS, content_type='application/json')
+    assert response.status_code == 415, response.data
+
+
+def test_lookup_slips(test_client, post_slips):
+    post_slips(data=[slip_obj.slip, slip_obj.slip2], headers=HEADERS)
+    pairs = [
+        {'date': slip['date'], 'ref_num': slip['ref_num']}
+        for slip in (slip_obj.slip, slip_obj.slip2, slip_obj.slip3, slip_obj.slip)
+    ]
+    # Date of slip and RRN of slip2 - must not match anything.
+    crossed = {'date': '2020-02-07', 'ref_num': slip_obj.slip2['ref_num']}
+    response = test_client.post(f'{API_URL}/lookup', json=pairs + [crossed], headers=HEADERS)
+    assert response.status_code == 200, response.data
+    result = json.loads(response.data)
+    assert sorted(slip['ref_num'] for slip in result['found']) == \
+        [slip_obj.slip['ref_num'], slip_obj.slip2['ref_num']]
+    assert result['missing'] == [pairs[2], crossed]
+
+
+def test_lookup_slips_no_auth(test_client, init_database):
+    pairs = [{'date': slip_obj.slip['date'], 'ref_num': slip_obj.slip['ref_num']}]
+    response = test_client.post(f'{API_URL}/lookup', json=pairs)
+    assert response.status_code == 401, response.data
+
+
+def test_lookup_slips_bad_request(test_client, init_database):
+    pairs = [{'date': slip_obj.slip['date']}]
+    response = test_client.post(f'{API_URL}/lookup', json=pairs, headers=HEADERS)
+    assert response.status_code == 400, response.data
+
+
+def test_basic_auth_cache(test_client, get_slips):
+    param = fixture_get[(200, 20)][0]
+    assert get_slips(param, headers=HEADERS).status_code == 200
+    cache = test_client.application.extensions['credentials_cache']
+    cache.clear()
+    hits = cache.hits
+    assert get_slips(param, headers=HEADERS).status_code == 200
+    assert get_slips(param, headers=HEADERS).status_code == 200
+    assert cache.hits == hits + 1
+    # Plain credentials are never kept.
+    assert all(len(key) == 64 for key in cache._data)
+
+
+def test_basic_auth_cache_revoked(test_client, get_slips):
+    param = fixture_get[(200, 20)][0]
+    assert get_slips(param, headers=HEADERS).status_code == 200
+    api_password = test_client.application.config['API_PASSWORD']
+    test_client.application.config['API_PASSWORD'] = 'revoked'
+    try:
+        assert get_slips(param, headers=HEADERS).status_code == 401
+    finally:
+        test_client.application.config['API_PASSWORD'] = api_password
+
+
+def get_token(test_client):
+    response = test_client.post('http://127.0.0.1:5000/api/token', headers=HEADERS)
+    assert response.status_code == 200, response.data
+    return json.loads(response.data)['token']
+
+
+def test_token_auth(test_client, get_slips):
+    headers = {'Authorization': f'Bearer {get_token(test_client)}'}
+    param = fixture_get[(200, 20)][0]
+    assert get_slips(param, headers=headers).status_code == 200
+
+
+def test_token_auth_bad_token(get_slips):
+    headers = {'Authorization': 'Bearer not.a.token'}
+    param = fixture_get[(200, 20)][0]
+    assert get_slips(param, headers=headers).status_code == 401
+
+
+def test_token_auth_revoked(test_client, get_slips):
+    headers = {'Authorization': f'Bearer {get_token(test_client)}'}
+    param = fixture_get[(200, 20)][0]
+    api_password = test_client.application.config['API_PASSWORD']
+    test_client.application.config['API_PASSWORD'] = 'revoked'
+    try:
+        assert get_slips(param, headers=headers).status_code == 401
+    finally:
+        test_client.application.config['API_PASSWORD'] = api_password
+
+
+def test_token_no_auth(test_client):
+    response = test_client.post('http://127.0.0.1:5000/api/token')
+    assert response.status_code == 401, response.data
+
+
+def test_load_schema_cache(tmp_path):
+    from flask_app.api.schema import load_schema
+
+    schema_path = tmp_path / 'schema.yaml'
+    cache_path = tmp_path / 'schema.json'
+    schema_path.write_text('openapi: 3.0.0\npaths: {}\n')
+    assert load_schema(str(schema_path), str(cache_path)) == {'openapi': '3.0.0', 'paths': {}}
+    assert cache_path.exists()
+    assert load_schema(str(schema_path), str(cache_path)) == {'openapi': '3.0.0', 'paths': {}}
+
+    schema_path.write_text('openapi: 3.0.1\npaths: {}\n')
+    assert load_schema(str(schema_path), str(cache_path))['openapi'] == '3.0.1'
+
+
+def test_bulk_update_and_delete_slips(test_client, post_slips):
+    post_slips(data=list(slip_obj.slips), headers=HEADERS)
+    params = {'date': ['2020-02-01', '2020-03-31'], 'pos_id': slip_obj.slip['pos_id']}
+    response = test_client.patch(
+        API_URL, query_string=params, json={'object_code': 'ZZ99'}, headers=HEADERS
+    )
+    assert response.status_code == 200, response.data
+    assert json.loads(response.data) == {'affected': 3}
+
+    params = {'date': ['2020-02-06'], 'object_code': 'ZZ99'}
+    response = test_client.delete(API_URL, query_string=params, headers=HEADERS)
+    assert response.status_code == 200, response.data
+    assert json.loads(response.data) == {'affected': 3}
+    response = test_client.delete(API_URL, query_string=params, headers=HEADERS)
+    assert json.loads(response.data) == {'affected': 0}
+
+
+def test_bulk_update_slips_normalises_values(test_client, post_slips):
+    post_slips(data=list(slip_obj.slips), headers=HEADERS)
+    params = {'date': ['2020-02-01', '2020-03-31'], 'pos_id': slip_obj.slip['pos_id']}
+    response = test_client.patch(
+        API_URL, query_string=params, json={'object_code': 'ZZ98', 'pos_id': '4321'},
+        headers=HEADERS
+    )
+    assert json.loads(response.data) == {'affected': 3}
+
+    params = {'date': ['2020-02-01', '2020-03-31'], 'object_code': 'ZZ98', 'pos_id': '4321'}
+    response = test_client.get(API_URL, query_string=params, headers=HEADERS)
+    assert response.status_code == 200, response.data
+    rows = json.loads(response.data)['data']
+    assert len(rows) == 3
+    assert {row['pos_id'] for row in rows} == {'00004321'}
+    response = test_client.delete(API_URL, query_string=params, headers=HEADERS)
+    assert json.loads(response.data) == {'affected': 3}
+
+
+def test_bulk_delete_slips_no_filter(test_client, init_database):
+    params = {'date': ['2020-01-01', '2020-01-02']}
+    response = test_client.delete(API_URL, query_string=params, headers=HEADERS)
+    assert response.status_code == 400, response.data
+
+
+@pytest.mark.parametrize('pos_id', ['x1234', '1234x', '123456789'])
+def test_bulk_delete_slips_bad_pos_id(test_client, init_database, pos_id):
+    params = {'date': ['2020-01-01'], 'pos_id': pos_id}
+    response = test_client.delete(API_URL, query_string=params, headers=HEADERS)
+    assert response.status_code == 400, response.data
+
+
+@pytest.mark.parametrize('values', [{'summ': '1'}, {'pos_id': 'x1234'}, {'pos_id': '1234x'}])
+def test_bulk_update_slips_bad_values(test_client, init_database, values):
+    params = {'date': ['2020-01-01'], 'object_code': 'KG34'}
+    response = test_client.patch(
+        API_URL, query_string=params, json=values, headers=HEADERS
+    )
+    assert response.status_code == 400, response.data
+
+
+def test_bulk_delete_slips_no_auth(test_client, init_database):
+    params = {'date': ['2020-01-01'], 'object_code': 'KG34'}
+    response = test_client.delete(API_URL, query_string=params)
+    assert response.status_code == 401, response.data
+
+
+@pytest.mark.parametrize('method, url, params, data', [
+    ('get', API_URL, {'date': ['2020-02-30']}, None),
+    ('get', API_URL, {'date': ['2020-02-01', '2020-13-01']}, None),
+    ('get', f'{API_URL}/2020-02-30/123456789012', None, None),
+    ('delete', f'{API_URL}/2020-02-30/123456789012', None, None),
+    ('get', 'http://127.0.0.1:5000/api/stats', {'date': ['2020-02-30']}, None),
+    ('post', f'{API_URL}/lookup', None, [{'date': '2020-02-30', 'ref_num': '123456789012'}]),
+    ('delete', API_URL, {'date': ['2020-02-30'], 'object_code': 'KG34'}, None),
+])
+def test_impossible_dates(test_client, init_database, method, url, params, data):
+    response = getattr(test_client, method)(url, query_string=params, json=data, headers=HEADERS)
+    assert response.status_code == 400, response.data
+
+
+def test_get_slips_etag(get_slips, post_slips):
+    params = {'date': ['2020-02-01', '2020-02-29']}
+    response = get_slips(params=params, headers=HEADERS)
+    etag = response.headers['ETag']
+    assert response.status_code == 200, response.data
+
+    response = get_slips(params=params, headers={**HEADERS, 'If-None-Match': etag})
+    assert response.status_code == 304, response.data
+    assert response.headers['ETag'] == etag
+    assert not response.data
+    other_params = {**params, 'per_page': 5}
+    response = get_slips(params=other_params, headers={**HEADERS, 'If-None-Match': etag})
+    assert response.status_code == 200, response.data
+
+    post_slips(data=list(slip_obj.slips), headers=HEADERS)
+    response = get_slips(params=params, headers={**HEADERS, 'If-None-Match': etag})
+    assert response.status_code == 200, response.data
+    assert response.headers['ETag'] != etag
+
+
+def test_get_slip_etag(get_slip, post_slips, delete_slip):
+    post_slips(data=[slip_obj.slip], headers=HEADERS)
+    date, ref_num = slip_obj.slip['date'], slip_obj.slip['ref_num']
+    response = get_slip(date, ref_num, headers=HEADERS)
+    etag = response.headers['ETag']
+    response = get_slip(date, ref_num, headers={**HEADERS, 'If-None-Match': etag})
+    assert response.status_code == 304, response.data
+
+    delete_slip(date, ref_num, headers=HEADERS)
+    response = get_slip(date, ref_num, headers={**HEADERS, 'If-None-Match': etag})
+    assert response.status_code == 404, response.data
+
+
+def test_get_stats(test_client, post_slips, update_slip):
+    post_slips(data=list(slip_obj.slips), headers=HEADERS)
+    url = 'http://127.0.0.1:5000/api/stats'
+    params = {'date': ['2020-02-06'], 'object_code': slip_obj.slip['object_code']}
+    response = test_client.get(url, query_string=params, headers=HEADERS)
+    assert response.status_code == 200, response.data
+    stats = json.loads(response.data)
+    summ = sum(float(slip['summ']) for slip in slip_obj.slips)
+    assert len(stats) == 1
+    assert stats[0]['date'] == '2020-02-06'
+    assert stats[0]['count'] == 3
+    assert stats[0]['summ'] == pytest.approx(summ)
+    assert stats[0]['operations'][slip_obj.slip['operation_type']]['count'] == 3
+
+    response = test_client.get(
+        url, query_string={**params, 'group_by': 'object_code'}, headers=HEADERS
+    )
+    assert json.loads(response.data) == [{
+        'object_code': slip_obj.slip['object_code'],
+        'count': 3,
+        'summ': stats[0]['summ'],
+        'operations': stats[0]['operations'],
+    }]
+
+    # pos_id is normalised as for slips.
+    params = {'date': ['2020-02-06'], 'pos_id': slip_obj.slip['pos_id'].lstrip('0')}
+    response = test_client.get(url, query_string=params, headers=HEADERS)
+    assert json.loads(response.data) == stats
+
+    slip = {**slip_obj.slip, 'object_code': 'ZZ99'}
+    update_slip(slip['date'], slip['ref_num'], data=slip, headers=HEADERS)
+    response = test_client.get(url, query_string=params, headers=HEADERS)
+    assert json.loads(response.data)[0]['count'] == 2
+
+
+def test_get_stats_no_auth(test_client, init_database):
+    response = test_client.get(
+        'http://127.0.0.1:5000/api/stats', query_string={'date': ['2020-01-01']}
+    )
+    assert response.status_code == 401, response.data
+
+
+def test_list_slips_result_cache(test_client, get_slips, post_slips):
+    cache = test_client.application.extensions['result_cache']
+    hits = cache.stats()['hits']
+    params = {'date': ['2020-02-06'], 'per_page': 7}
+    first = get_slips(params=params, headers=HEADERS)
+    second = get_slips(params=params, headers=HEADERS)
+    assert second.status_code == 200, second.data
+    assert second.data == first.data
+    assert second.headers['Content-Type'] == first.headers['Content-Type']
+    assert cache.stats()['hits'] == hits + 1
+
+    post_slips(data=list(slip_obj.slips), headers=HEADERS)
+    third = get_slips(params=params, headers=HEADERS)
+    assert cache.stats()['hits'] == hits + 1
+    assert json.loads(third.data)['meta']['total'] == json.loads(first.data)['meta']['total'] + 3
+
+    response = test_client.get('http://127.0.0.1:5000/api/cache/stats', headers=HEADERS)
+    assert response.status_code == 200, response.data
+    assert json.loads(response.data)['results']['hits'] == hits + 1
+
+
+def test_sized_ttl_cache():
+    cache = SizedTTLCache(maxbytes=10, ttl=60)
+    cache.set('a', b'12345')
+    cache.set('b', b'12345')
+    assert cache.stats()['bytes'] == 10
+    cache.get('a')
+    cache.set('c', b'1')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'12345'
+    cache.set('d', b'12345678901')
+    assert cache.get('d') is None
+    assert cache.stats()['bytes'] == 6
+
+
+class RedisStandIn:
+    """Emulates Redis client with a dict, ignoring expiration."""
+    def __init__(self, fail: bool = False):
+        self.data = {}
+        self.fail = fail
+
+    def get(self, name):
+        if self.fail:
+            raise ConnectionError('Connection refused')
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        if self.fail:
+            raise ConnectionError('Connection refused')
+        self.data[name] = value
+
+
+def test_redis_cache():
+    cache = RedisCache(RedisStandIn(), ttl=60)
+    assert cache.get('key') is None
+    cache.set('key', b'value')
+    assert cache.get('key') == b'value'
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+    cache = RedisCache(RedisStandIn(fail=True), ttl=60)
+    cache.set('key', b'value')
+    assert cache.get('key', b'default') == b'default'
@@ -2,6 +2,7 @@ import os
 from unittest import TestCase
 
 from flask import url_for
+from werkzeug.security import generate_password_hash
 
 from flask_app import create_app
 from flask_app.auth import db, models
@@ -89,6 +90,20 @@ class TestAuth(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'You&#39;re already logged in!', response.data)
 
+    def test_login_rehash(self):
+        with self._app.app_context():
+            user = models.User.query.filter_by(username=TestUser.username).first()
+            user.password_hash = generate_password_hash(TestUser.password, 'pbkdf2:sha256:1000')
+            user.is_verified = True
+            db.session.commit()
+        response = self.login_(TestUser.username, TestUser.password)
+        self.assertEqual(response.status_code, 302)
+        with self._app.app_context():
+            user = models.User.query.filter_by(username=TestUser.username).first()
+            self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:150000$'))
+            self.assertFalse(models.needs_rehash(user.password_hash))
+            self.assertTrue(user.check_password(TestUser.password))
+
     def test_login_bad_form(self):
         response = self.login_('not', 'tes', True)
         self.assertEqual(response.status_code, 200)
@@ -1,7 +1,12 @@
+import codecs
+import csv
+import gzip
+import io
+import json
 import os
+import time
 
 import pytest
-import werkzeug
 
 
 os.environ['DATABASE_URL'] = 'sqlite://'
@@ -208,14 +213,10 @@ def test_download_get(test_client, init_database, login):
     assert headers in response.data
 
 
-def test_download_get_out_of_range(test_client, init_database, login):
-    try:
-        response = test_client.get('/download?page=99999999')
-    except werkzeug.exceptions.NotFound:
-        assert True
-    else:
-        assert False, 'should be werkzeug.exceptions.NotFound raised'
-    # assert response.status_code == 404
+@pytest.mark.parametrize('file_format', ['csv', 'csv.gz', 'parquet'])
+def test_download_get_out_of_range(test_client, init_database, login, file_format):
+    response = test_client.get(f'/download?page=99999999&format={file_format}')
+    assert response.status_code == 404
 
 
 def test_download_post_no_login(test_client, init_database):
@@ -226,3 +227,144 @@ def test_download_post_no_login(test_client, init_database):
 def test_download_post(test_client, init_database, login):
     response = test_client.post('/download?page=1')
     assert response.status_code == 405
+
+
+def test_download_get_all(test_client, init_database, login):
+    def read_csv(data):
+        return list(csv.reader(io.StringIO(data.decode('utf-8-sig')), delimiter=';'))
+
+    page = read_csv(test_client.get('/download?page=1').data)
+    response = test_client.get('/download?page=0')
+    assert response.status_code == 200
+    assert response.data.count(codecs.BOM_UTF8) == 1
+    data = read_csv(response.data)
+    # Full file has no _id column.
+    assert data[:len(page)] == [row[:-1] for row in page]
+
+
+def test_download_get_gzip(test_client, init_database, login):
+    csv_data = test_client.get('/download?page=0').data
+    response = test_client.get('/download?page=0&format=csv.gz')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    assert gzip.decompress(response.data) == csv_data
+
+
+def test_download_get_unknown_format(test_client, init_database, login):
+    response = test_client.get('/download?page=0&format=xls')
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('page_id', [0, 1])
+def test_download_get_parquet(test_client, init_database, login, page_id):
+    pq = pytest.importorskip('pyarrow.parquet')
+    csv_rows = test_client.get(f'/download?page={page_id}').data.decode('utf-8-sig')
+    csv_rows = list(csv.reader(io.StringIO(csv_rows), delimiter=';'))
+    response = test_client.get(f'/download?page={page_id}&format=parquet')
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.data))
+    assert table.num_rows == len(csv_rows) - 1
+    # Pages have _id column, as csv pages do.
+    assert table.column_names == csv_rows[0]
+    if page_id:
+        assert table.column('_id').to_pylist() == [int(row[-1]) for row in csv_rows[1:]]
+
+
+def wait_for_export(test_client, job_id, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = json.loads(test_client.get(f'/exports/{job_id}').data)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+def test_export_job(test_client, init_database, login):
+    csv_data = test_client.get('/download?page=0').data
+    response = test_client.post('/exports?format=csv')
+    assert response.status_code == 202
+    job = json.loads(response.data)
+    job = wait_for_export(test_client, job['id'])
+    assert job['status'] == 'done', job
+    assert job['size'] == len(csv_data)
+
+    # Same query reuses the same job.
+    response = test_client.post('/exports?format=csv')
+    assert json.loads(response.data)['id'] == job['id']
+
+    response = test_client.get(job['url'])
+    assert response.status_code == 200
+    assert response.data == csv_data
+
+    response = test_client.get(job['url'], headers={'Range': 'bytes=100-'})
+    assert response.status_code == 206
+    assert response.data == csv_data[100:]
+
+
+def test_export_job_unknown(test_client, init_database, login):
+    assert test_client.get('/exports/123').status_code == 404
+    assert test_client.get('/exports/123/file').status_code == 404
+
+
+def test_export_stale_run_is_not_published(test_client, init_database):
+    from flask_app.base.exports import exports
+    app = test_client.application
+    job_id = 'f' * 32
+    with app.test_request_context():
+        with open(exports.path(job_id, '.json'), 'w') as f:
+            json.dump({'form': {}, 'format': 'csv', 'created': time.time(), 'token': 'new'}, f)
+        fd = os.open(exports.path(job_id, '.old.part'), os.O_CREAT | os.O_WRONLY)
+        # Slow run of the job, resubmitted as failed meanwhile.
+        exports.run(app, job_id, 'old', {}, 'csv', fd)
+        assert not os.path.exists(exports.path(job_id))
+        assert not os.path.exists(exports.path(job_id, '.old.part'))
+        exports.remove(exports.path(job_id, '.json'))
+
+
+@pytest.mark.parametrize('job_id', ['..', '.json', 'A' * 32, '0' * 31 + 'g'])
+def test_export_job_malformed_id(test_client, init_database, login, job_id):
+    from flask_app.base.exports import exports
+    assert not exports.is_valid(job_id)
+    assert test_client.get(f'/exports/{job_id}').status_code == 404
+    assert test_client.get(f'/exports/{job_id}/file').status_code == 404
+
+
+def test_prettify_result_matches_to_json(init_database):
+    from db import Slip
+    from flask_app.base import functions
+
+    slip = Slip.query.first()
+    row = Slip.query.with_entities(*functions.display_columns()). \
+        filter(Slip.file_link == slip.file_link).one()
+    expected = functions.exclude_keys(slip.to_json(), functions.exclude_list)
+    result = functions.prettify_result([row])
+    assert result == [{**expected, '_id': '1'}]
+    assert list(result[0]) == [*expected, '_id']
+
+
+def test_output_paging_does_not_write_user(test_client, init_database, login):
+    from flask_app.auth.models import User
+    form_data = {'start_date': '2020-01-01', 'end_date': '2020-01-02'}
+    test_client.post('/output?page=1', data=form_data)
+    response = test_client.get('/output?page=2')
+    assert response.status_code == 200
+    assert User.query.filter_by(username='test_user').first().last_query is None
+
+
+@pytest.mark.parametrize('store_kind', ['cookie', 'memory', 'file'])
+def test_query_store(test_client, tmp_path, store_kind):
+    from flask_app.base.query_store import CookieQueryStore, MemoryQueryStore, FileQueryStore
+    store = {
+        'cookie': CookieQueryStore,
+        'memory': MemoryQueryStore,
+        'file': lambda: FileQueryStore(str(tmp_path)),
+    }[store_kind]()
+    form = {'start_date': '2020-01-01', 'object_code': 'KG34'}
+    with test_client.application.test_request_context():
+        assert store.get('1') is None
+        store.set('1', form)
+        assert store.get('1') == form
+        assert store.get('2') is None
+        store.set('1', {**form, 'object_code': ''})
+        assert store.get('1')['object_code'] == ''
@@ -1,3 +1,5 @@
+import tempfile
+
 ENV = 'development'
 DEBUG = True
 TESTING = True
@@ -12,5 +14,12 @@ MAIL_USE_TLS = True
 MAIL_USERNAME = 'test@gmail.com'
 MAIL_PASSWORD = '123456789456'
 MAIL_FLAG = True
+MAIL_QUEUE_DIR = tempfile.mkdtemp(prefix='slip_mail_')
 
 WTF_CSRF_ENABLED = False
+
+EXPORT_DIR = tempfile.mkdtemp(prefix='slip_exports_')
+API_VALIDATE_RESPONSES = True
+SCHEDULER_DIR = tempfile.mkdtemp(prefix='slip_scheduler_')
+SCHEDULER_LOCK_PATH = f'{SCHEDULER_DIR}/scheduler.lock'
+SCHEDULER_STATE_PATH = f'{SCHEDULER_DIR}/scheduler.json'
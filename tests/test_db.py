@@ -0,0 +1,262 @@
+import datetime as dt
+from threading import Event, Thread
+from time import perf_counter
+
+import pytest
+from sqlalchemy.exc import OperationalError
+import sqlalchemy.orm as orm
+
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from config import Config
+from db import Base, Session, Slip, SlipStat, SlipVersion, engines
+from db.partitions import month_bounds, partition_name, ensure_partitions, bump_versions, get_versions
+from db.stats import add_stats, refresh_stats
+from slip.utils import insert_db
+from .slip_obj import SlipFactory
+
+
+fixture_month_bounds = {
+    (dt.date(2020, 1, 15), dt.date(2020, 1, 20)): [
+        (dt.date(2020, 1, 1), dt.date(2020, 2, 1)),
+    ],
+    (dt.date(2019, 12, 31), dt.date(2020, 2, 1)): [
+        (dt.date(2019, 12, 1), dt.date(2020, 1, 1)),
+        (dt.date(2020, 1, 1), dt.date(2020, 2, 1)),
+        (dt.date(2020, 2, 1), dt.date(2020, 3, 1)),
+    ],
+    (dt.date(2020, 2, 1), dt.date(2020, 1, 1)): [],
+}
+
+
+@pytest.mark.parametrize('dates, result', fixture_month_bounds.items())
+def test_month_bounds(dates, result):
+    assert list(month_bounds(*dates)) == result
+
+
+def test_partition_name():
+    assert partition_name(dt.date(2020, 2, 6)) == 'slips_y2020m02'
+
+
+def test_ensure_partitions_sqlite(init_database):
+    bind = init_database.session.connection()
+    assert ensure_partitions(bind, [dt.date(2020, 1, 1)]) == []
+
+
+class PartitionedBind:
+    """Records statements, answers pg_inherits query with existing partitions."""
+    class dialect:
+        name = 'postgresql'
+
+    def __init__(self, url, partitions):
+        self.engine = self
+        self.url = make_url(url)
+        self.partitions = partitions
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        if 'pg_inherits' in statement:
+            return [(name,) for name in self.partitions]
+
+
+def test_ensure_partitions_creates_missing_only():
+    bind = PartitionedBind('postgresql://partitions/test', ['slips_y2020m01'])
+    dates = [dt.date(2020, 1, 5), dt.date(2020, 2, 5), None]
+    assert ensure_partitions(bind, dates) == ['slips_y2020m01', 'slips_y2020m02']
+    assert 'pg_inherits' in bind.statements[0]
+    assert len(bind.statements) == 2
+    assert bind.statements[1].startswith('CREATE TABLE IF NOT EXISTS slips_y2020m02')
+    # Known partitions are cached, the created one is looked up again.
+    bind.statements.clear()
+    ensure_partitions(bind, [dt.date(2020, 1, 20)])
+    assert bind.statements == []
+    bind.partitions.append('slips_y2020m02')
+    ensure_partitions(bind, dates)
+    assert len(bind.statements) == 1
+    bind.statements.clear()
+    ensure_partitions(bind, dates)
+    assert bind.statements == []
+
+
+def test_bump_versions(init_database):
+    session = init_database.session
+    start, end = dt.date(2032, 1, 1), dt.date(2032, 2, 29)
+    bump_versions(session, [dt.date(2032, 1, 5)])
+    # Month rows, inserted in between, are incremented, not inserted again.
+    bump_versions(session, [dt.date(2032, 1, 6), dt.date(2032, 2, 1), None])
+    assert get_versions(session, start, end) == [
+        (dt.date(2032, 1, 1), 2),
+        (dt.date(2032, 2, 1), 1),
+    ]
+    session.query(SlipVersion).filter(SlipVersion.month >= start).delete()
+    session.commit()
+
+
+def test_stats_incremental_matches_refresh(init_database):
+    session = init_database.session
+    slips = [
+        {'date': dt.date(2031, 5, 1), 'object_code': 'KG01', 'pos_id': '1',
+         'operation_type': 'Оплата', 'summ': '10.5'},
+        {'date': dt.date(2031, 5, 1), 'object_code': 'KG01', 'pos_id': '1',
+         'operation_type': 'Возврат', 'summ': 2.0},
+        {'date': dt.date(2031, 5, 2), 'object_code': None, 'pos_id': '2',
+         'operation_type': 'Оплата', 'summ': 3},
+    ]
+    for i, slip in enumerate(slips * 2):
+        session.add(Slip(**slip, file_link=f'stats_test_{i}'))
+    add_stats(session, slips)
+    add_stats(session, [*slips, {'date': None, 'pos_id': '3', 'summ': 1}])
+
+    def totals():
+        q = session.query(
+            SlipStat.date, SlipStat.object_code, SlipStat.pos_id,
+            SlipStat.operation_type, SlipStat.count, SlipStat.summ
+        ).filter(SlipStat.date >= dt.date(2031, 5, 1))
+        return sorted(q)
+
+    incremental = totals()
+    assert incremental == [
+        (dt.date(2031, 5, 1), 'KG01', '1', 'Возврат', 2, 4.0),
+        (dt.date(2031, 5, 1), 'KG01', '1', 'Оплата', 2, 21.0),
+        (dt.date(2031, 5, 2), '', '2', 'Оплата', 2, 6.0),
+    ]
+    refresh_stats(session, dt.date(2031, 5, 1), dt.date(2031, 5, 31))
+    assert totals() == incremental
+    session.query(Slip).filter(Slip.file_link.like('stats_test_%')).delete(synchronize_session=False)
+    session.query(SlipStat).filter(SlipStat.date >= dt.date(2031, 5, 1)).delete()
+    session.commit()
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f'sqlite:///{tmp_path / "slips.db"}'
+
+
+def test_engine_registry(db_url):
+    pragmas = {'journal_mode': 'WAL', 'busy_timeout': 1234, 'synchronous': 'NORMAL'}
+    engine = engines.get_engine(db_url, pragmas=pragmas, pool_size=2, max_overflow=1)
+    assert engines.get_engine(db_url) is engine
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 2
+
+    with engine.connect() as conn:
+        assert conn.execute('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.execute('PRAGMA busy_timeout').scalar() == 1234
+        # NORMAL
+        assert conn.execute('PRAGMA synchronous').scalar() == 1
+    with engine.connect():
+        pass
+
+    stats = engines.pool_stats()[repr(engine.url)]
+    assert stats['connects'] == 1
+    assert stats['checkouts'] == 2
+    assert stats['checked_in'] == 1
+    assert stats['checked_out'] == 0
+
+
+def test_flask_sqlalchemy_shares_engine(db_url):
+    from flask_app.database import SQLAlchemy
+    engine = SQLAlchemy().create_engine(make_url(db_url), {'pool_size': 3})
+    assert engines.get_engine(db_url) is engine
+
+
+def test_flask_sqlalchemy_driver_hacks(tmp_path):
+    from flask import Flask
+    from flask_app.database import SQLAlchemy
+    app = Flask(__name__, root_path=str(tmp_path))
+    app.config.update(SQLALCHEMY_NATIVE_UNICODE=None, SQLITE_BUSY_TIMEOUT=1234)
+    sa_url = make_url('sqlite:///slips.db')
+    options = {}
+    SQLAlchemy().apply_driver_hacks(app, sa_url, options)
+    # Relative path is resolved against app.root_path, as Flask-SQLAlchemy does.
+    assert sa_url.database == str(tmp_path / 'slips.db')
+    assert 'poolclass' not in options
+    assert options['pragmas'] == {'busy_timeout': 1234}
+
+
+def test_memory_engines_are_private():
+    assert engines.get_engine('sqlite://') is not engines.get_engine('sqlite://')
+    assert 'sqlite://' not in engines.pool_stats()
+
+
+def test_sqlite_profile():
+    pragmas = engines.sqlite_pragmas(vars(Config))
+    assert pragmas['journal_mode'] == 'WAL'
+    assert pragmas['synchronous'] == 'NORMAL'
+    assert pragmas['busy_timeout'] > 0
+    assert pragmas['mmap_size'] > 0
+    assert pragmas['cache_size'] < 0
+    assert 'journal_mode' not in engines.sqlite_pragmas({'SQLITE_JOURNAL_MODE': ''})
+
+
+@pytest.fixture(scope='module')
+def slip_batches():
+    slips = [SlipFactory.build().to_dict() for _ in range(3000)]
+    return [slips[i:i + 300] for i in range(0, len(slips), 300)]
+
+
+def search_and_insert(engine, slip_batches, readers: int = 4):
+    """
+    Runs insert_db batches, as the parser does, while readers search by
+    date, as the web app does.  Returns lock errors and latencies.
+    """
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    read_session = orm.sessionmaker(bind=engine)
+    done = Event()
+    stats = {'read_errors': 0, 'write_errors': 0, 'reads': [], 'writes': []}
+
+    def read():
+        while not done.is_set():
+            session = read_session()
+            start = perf_counter()
+            try:
+                session.query(Slip).filter(Slip.date == dt.date(2020, 1, 10)).limit(100).all()
+            except OperationalError:
+                stats['read_errors'] += 1
+            else:
+                stats['reads'].append(perf_counter() - start)
+            finally:
+                session.close()
+
+    threads = [Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for batch in slip_batches:
+            start = perf_counter()
+            try:
+                insert_db(batch)
+            except OperationalError:
+                stats['write_errors'] += 1
+            else:
+                stats['writes'].append(perf_counter() - start)
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+        Session.configure(bind=None)
+    return stats
+
+
+@pytest.mark.parametrize('profile', ['default', 'rollback journal'])
+def test_concurrent_search_and_insert(tmp_path, slip_batches, profile):
+    if profile == 'default':
+        pragmas = engines.sqlite_pragmas(vars(Config))
+    else:
+        pragmas = {'journal_mode': 'DELETE', 'busy_timeout': 0}
+    engine = engines.get_engine(f'sqlite:///{tmp_path / "slips.db"}', pragmas=pragmas)
+    stats = search_and_insert(engine, slip_batches)
+
+    reads = sorted(stats['reads'])
+    print(
+        f'{profile}: {stats["read_errors"]} read and {stats["write_errors"]} write lock errors, '
+        f'{len(reads)} reads, p95 {reads[int(len(reads) * 0.95)] * 1000:.1f} ms, '
+        f'max write {max(stats["writes"], default=0) * 1000:.1f} ms'
+    )
+    if profile == 'default':
+        assert stats['read_errors'] == stats['write_errors'] == 0
+        with engine.connect() as conn:
+            assert conn.execute('select count(*) from slips').scalar() == 3000
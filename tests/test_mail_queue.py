@@ -0,0 +1,156 @@
+import json
+import os
+import socketserver
+from threading import Thread
+from time import perf_counter, time
+
+import pytest
+from flask_mail import Message
+
+from flask_app.auth.mail_queue import mail_queue
+from flask_app.auth import db, models
+
+
+test_config_path = os.path.join(os.path.dirname(__file__), 'test_config.py')
+os.environ['FLASK_APPLICATION_SETTINGS'] = test_config_path
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib.sendmail."""
+    def reply(self, line: str):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 stand-in')
+        envelope = {'to': []}
+        data = None
+        for raw in self.rfile:
+            line = raw.decode().rstrip('\r\n')
+            if data is not None:
+                if line == '.':
+                    self.server.messages.append({**envelope, 'data': '\n'.join(data)})
+                    data = None
+                    self.reply('250 OK')
+                else:
+                    data.append(line)
+                continue
+            command = line[:4].upper()
+            if command in ('EHLO', 'HELO', 'NOOP'):
+                self.reply('250 stand-in')
+            elif command in ('MAIL', 'RSET'):
+                envelope = {'to': []}
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                if self.server.reject:
+                    self.reply('550 No such user')
+                else:
+                    envelope['to'].append(line.split(':', 1)[1].strip('<> '))
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                data = []
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, reject: bool = False):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.reject = reject
+        self.messages = []
+        self.connections = 0
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mail_app(test_client, smtp_server, tmp_path):
+    """Points Flask-Mail to the stand-in and mail queue to an empty dir."""
+    app = test_client.application
+    state = app.extensions['mail']
+    saved_state = dict(vars(state))
+    saved_dir = app.config['MAIL_QUEUE_DIR']
+    state.server, state.port = smtp_server.server_address
+    state.use_tls = state.use_ssl = state.suppress = False
+    state.username = state.password = None
+    app.config['MAIL_QUEUE_DIR'] = str(tmp_path)
+    yield app
+    vars(state).update(saved_state)
+    app.config['MAIL_QUEUE_DIR'] = saved_dir
+
+
+def queue_message(recipient: str = 'user@test.test') -> str:
+    message = Message('Test', sender='app@test.test', recipients=[recipient], body='Body')
+    return mail_queue.put(message)
+
+
+def test_register_queues_mail(mail_app, smtp_server):
+    form = {
+        'username': 'mail_user',
+        'email': 'mail_user@test.test',
+        'password': 'password',
+        'password2': 'password',
+    }
+    response = mail_app.test_client().post('/register', data=form)
+    assert response.status_code == 302
+    assert smtp_server.messages == []
+    assert len(os.listdir(mail_app.config['MAIL_QUEUE_DIR'])) == 1
+
+    assert mail_queue.flush() == 1
+    assert smtp_server.messages[0]['to'] == ['mail_user@test.test']
+    assert os.listdir(mail_app.config['MAIL_QUEUE_DIR']) == []
+    models.User.query.filter_by(username='mail_user').delete()
+    db.session.commit()
+
+
+def test_flush_batches(mail_app, smtp_server):
+    count = 3 * mail_app.config['MAIL_BATCH_SIZE'] // 2
+    for i in range(count):
+        queue_message(f'user{i}@test.test')
+    start = perf_counter()
+    assert mail_queue.flush() == mail_app.config['MAIL_BATCH_SIZE']
+    assert mail_queue.flush() == count - mail_app.config['MAIL_BATCH_SIZE']
+    seconds = perf_counter() - start
+    assert mail_queue.flush() == 0
+    assert smtp_server.connections == 2
+    assert len(smtp_server.messages) == count
+    print(f'{count / seconds:.0f} e-mails/s')
+
+
+def test_retry_and_fail(mail_app, smtp_server):
+    smtp_server.reject = True
+    message_id = queue_message()
+    assert mail_queue.flush() == 0
+    path = os.path.join(mail_app.config['MAIL_QUEUE_DIR'], f'{message_id}.json')
+    with open(path) as f:
+        data = json.load(f)
+    assert data['attempts'] == 1
+    assert data['next_attempt'] > time()
+    # Not ready yet.
+    assert mail_queue.flush() == 0
+
+    data['next_attempt'] = 0
+    data['attempts'] = mail_app.config['MAIL_MAX_ATTEMPTS'] - 1
+    mail_queue.write(message_id, data)
+    mail_queue.flush()
+    assert os.listdir(mail_app.config['MAIL_QUEUE_DIR']) == [f'{message_id}.failed']
+
+
+def test_retry_on_connection_error(mail_app, smtp_server):
+    message_id = queue_message()
+    mail_app.extensions['mail'].port = 1
+    assert mail_queue.flush() == 0
+    assert os.listdir(mail_app.config['MAIL_QUEUE_DIR']) == [f'{message_id}.json']
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from flask_app.scheduler import Scheduler, scheduler
+
+
+test_config_path = os.path.join(os.path.dirname(__file__), 'test_config.py')
+os.environ['FLASK_APPLICATION_SETTINGS'] = test_config_path
+
+
+@pytest.fixture
+def app(test_client, tmp_path):
+    """Points scheduler state and lock to an empty dir."""
+    app = test_client.application
+    saved = {key: app.config[key] for key in ('SCHEDULER_STATE_PATH', 'SCHEDULER_LOCK_PATH')}
+    app.config['SCHEDULER_STATE_PATH'] = str(tmp_path / 'scheduler.json')
+    app.config['SCHEDULER_LOCK_PATH'] = str(tmp_path / 'scheduler.lock')
+    app.config['TEST_INTERVAL'] = 10
+    yield app
+    app.config.update(saved)
+
+
+@pytest.fixture
+def test_scheduler(app):
+    sched = Scheduler(app)
+    calls = []
+
+    @sched.job('ok', 'TEST_INTERVAL')
+    def ok():
+        calls.append('ok')
+        return len(calls)
+
+    @sched.job('broken', 'TEST_INTERVAL')
+    def broken():
+        raise RuntimeError('broken job')
+
+    sched.calls = calls
+    yield sched
+    sched.release()
+    app.extensions['scheduler'] = scheduler
+
+
+def test_run_pending(test_scheduler):
+    assert test_scheduler.run_pending(now=1000) == ['ok', 'broken']
+    assert test_scheduler.run_pending(now=1005) == []
+    state = test_scheduler.load_state()
+    assert state['ok']['history'][0]['status'] == 'done'
+    assert state['ok']['history'][0]['result'] == 1
+    assert state['broken']['history'][0]['status'] == 'failed'
+    assert 'broken job' in state['broken']['history'][0]['error']
+    # Start times are real, so the jobs aren't due at now=1005.
+    assert test_scheduler.calls == ['ok']
+
+
+def test_zero_interval_disables(app, test_scheduler):
+    app.config['TEST_INTERVAL'] = 0
+    assert test_scheduler.run_pending() == []
+    assert test_scheduler.load_state() == {}
+
+
+def test_history_is_trimmed(app, test_scheduler):
+    for _ in range(app.config['SCHEDULER_HISTORY'] + 5):
+        test_scheduler.run_job('ok')
+    history = test_scheduler.load_state()['ok']['history']
+    assert len(history) == app.config['SCHEDULER_HISTORY']
+    assert history[0]['result'] == app.config['SCHEDULER_HISTORY'] + 5
+
+
+def test_single_leader(app):
+    first, second = Scheduler(), Scheduler()
+    lock_path = app.config['SCHEDULER_LOCK_PATH']
+    assert first.acquire(lock_path)
+    assert first.acquire(lock_path)
+    assert not second.acquire(lock_path)
+    first.release()
+    assert second.acquire(lock_path)
+    second.release()
+
+
+def test_failed_db_job_is_rolled_back(app, test_scheduler):
+    from flask_app.auth import db
+    from flask_app.auth.models import User
+
+    @test_scheduler.job('duplicate_user', 'TEST_INTERVAL')
+    def duplicate_user():
+        username = User.query.first().username
+        db.session.add(User(username=username, email='duplicate@user.ad'))
+        db.session.flush()
+
+    test_scheduler.jobs['delete_unverified_users'] = scheduler.jobs['delete_unverified_users']
+    assert test_scheduler.run_job('duplicate_user')['status'] == 'failed'
+    assert test_scheduler.run_job('delete_unverified_users')['status'] == 'done'
+
+
+def test_builtin_jobs(app):
+    assert set(scheduler.jobs) == {'delete_unverified_users', 'refresh_stats', 'prune_files'}
+    assert scheduler.run_job('delete_unverified_users')['status'] == 'done'
+    assert scheduler.run_job('prune_files')['status'] == 'done'
+    assert scheduler.load_state().keys() == {'delete_unverified_users', 'prune_files'}